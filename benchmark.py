@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""
+Benchmarks
+==========
+Times the analysis functions on synthetic recordings with increasing
+numbers of beats and runs an end-to-end detection + JF analysis over the
+locally cached GUDb recordings (see recordings.py).
+
+Every run is saved as JSON in the benchmarks directory and compared
+against the baseline. Cases which are slower than the baseline by more
+than the threshold are flagged and the script exits with status 1.
+
+python benchmark.py                # run and compare against the baseline
+python benchmark.py --save         # run and save as the new baseline
+python benchmark.py --beats 1000 8000 --threshold 1.5
+"""
+import sys
+import os
+import io
+import json
+import time
+import platform
+import argparse
+import contextlib
+import numpy as np
+
+import util
+import jf_analysis
+import sensitivity_analysis
+import scoring
+import synthetic
+import recordings
+
+# directory where the benchmark results are stored
+benchdir = "benchmarks"
+
+baseline_file = os.path.join(benchdir, "baseline.json")
+latest_file = os.path.join(benchdir, "latest.json")
+
+# Beat counts of the synthetic recordings. 100k beats is a 24h Holter recording.
+default_beats = [1000, 10000, 100000]
+
+# A case is flagged if it's slower than the baseline by this factor.
+default_threshold = 1.25
+
+fs = 250
+
+
+# Fast functions are called repeatedly until a measurement takes this long (s)
+min_measurement = 0.05
+
+
+def timeit(func, repeat=3):
+    """
+    Best of repeat measurements of the time of one call of func in s.
+    Anything printed by func is discarded.
+    """
+    best = np.inf
+    number = 1
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            while True:
+                t = time.perf_counter()
+                for j in range(number):
+                    func()
+                t = time.perf_counter() - t
+                if t >= min_measurement:
+                    break
+                number = number * 10
+            best = min(best, t / number)
+    return best
+
+
+def micro_cases(n_beats, seed=0):
+    """
+    Benchmark cases of the analysis functions for a recording with n_beats.
+    returns a dict of case name and function without arguments.
+    """
+    rec = synthetic.generate(n_beats, fs=fs, jitter=2E-3, missed=0.01, extra=0.01,
+                             delay=0.03, signal=False, seed=seed)
+    det = rec[synthetic.key_det]
+    anno = rec[synthetic.key_anno]
+    nSamples = rec[synthetic.key_nsamples]
+    cases = {}
+    cases["nearest_diff"] = lambda: jf_analysis.nearest_diff(anno, det)
+    cases["jf_evaluate"] = lambda: jf_analysis.evaluate(det, anno, fs, nSamples)
+    cases["calcMedianDelay"] = lambda: util.calcMedianDelay(det, anno)
+    cases["trim_after_detection"] = lambda: util.trim_after_detection(det, anno, jf_analysis.a, jf_analysis.b)
+    cases["sensitivity_evaluate"] = lambda: sensitivity_analysis.evaluate(det, anno, fs/10)
+    cases["matrix_score_8"] = lambda: scoring.score(scoring.prepare(anno, fs), [det] * 8)
+    return {"{}/{}".format(name, n_beats): f for name, f in cases.items()}
+
+
+def end_to_end_case(detector_name):
+    """
+    Detection and JF analysis of all cached recordings with one detector.
+    returns None if nothing is cached.
+    """
+    import registry
+    detectorfunc = registry.get(detector_name)[1]
+    keys = recordings.cached()
+    if not keys:
+        return None
+    data = [recordings.load(*k, download=False) for k in keys]
+    data = [d for d in data if d[1] is not None]
+    def run():
+        for ecg, anno in data:
+            detected_peaks = detectorfunc(ecg)
+            jf_analysis.evaluate(detected_peaks, anno, fs, len(ecg))
+    return run
+
+
+def run_benchmarks(beats, detector_name, repeat):
+    results = {}
+    for n in beats:
+        for name, f in micro_cases(n).items():
+            results[name] = timeit(f, repeat)
+            print("{:40s} {:12.6f} s".format(name, results[name]))
+    e2e = end_to_end_case(detector_name)
+    if e2e is None:
+        print("No cached recordings in '{}': skipping end-to-end run.".format(recordings.cachedir))
+    else:
+        name = "end_to_end/" + detector_name
+        results[name] = timeit(e2e, 1)
+        print("{:40s} {:12.6f} s".format(name, results[name]))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the ratio to the baseline for every case.
+    returns the names of the cases which are slower than threshold.
+    """
+    slower = []
+    print()
+    print("Comparison against baseline from", baseline["date"])
+    for name, t in results.items():
+        if name not in baseline["results"]:
+            print("{:40s}        new".format(name))
+            continue
+        ratio = t / baseline["results"][name]
+        flag = ""
+        if ratio > threshold:
+            flag = "SLOWER"
+            slower.append(name)
+        print("{:40s} {:10.2f}x {}".format(name, ratio, flag))
+    return slower
+
+
+def save(fname, results):
+    bench = {}
+    bench["date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    bench["platform"] = platform.platform()
+    bench["python"] = platform.python_version()
+    bench["numpy"] = np.__version__
+    bench["results"] = results
+    with open(fname, "w") as f:
+        f.write(json.dumps(bench, indent="\t"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the JF and sensitivity analysis.")
+    parser.add_argument("--beats", type=int, nargs="+", default=default_beats,
+                        help="beat counts of the synthetic recordings")
+    parser.add_argument("--threshold", type=float, default=default_threshold,
+                        help="flag cases slower than baseline by this factor")
+    parser.add_argument("--detector", default="two_average_detector",
+                        help="detector of the end-to-end run")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    args = parser.parse_args()
+
+    try:
+        os.mkdir(benchdir)
+    except OSError as error:
+        pass
+
+    results = run_benchmarks(args.beats, args.detector, args.repeat)
+    save(latest_file, results)
+
+    if args.save:
+        save(baseline_file, results)
+        print("Saved baseline to", baseline_file)
+    elif os.path.exists(baseline_file):
+        with open(baseline_file, "r") as f:
+            baseline = json.loads(f.read())
+        if compare(results, baseline, args.threshold):
+            print("Slowdowns beyond {}x found.".format(args.threshold))
+            sys.exit(1)
+    else:
+        print("No baseline found. Run with --save to create one.")
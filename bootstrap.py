@@ -0,0 +1,94 @@
+"""
+Bootstrap
+=========
+Percentile bootstrap confidence intervals of the mean score over
+subjects. The scores are bounded and skewed so a CI is more honest than
+mean +/- std.
+
+All cells (for example every detector, lead and experiment) are
+resampled together: the per subject scores are padded into one 2D array
+and each batch of resamples is a single NumPy operation over all cells.
+Batches can be spread over several processes and every batch has its
+own seed so the result doesn't depend on the number of processes.
+"""
+import numpy as np
+from multiprocessing import Pool
+
+# number of bootstrap resamples
+n_resamples = 10000
+
+# confidence level in %
+confidence = 95
+
+# resamples per batch, limits the memory per batch to
+# cells x batch_size x subjects values
+batch_size = 500
+
+
+def pad(samples):
+    """
+    Pads the scores of all cells with nan into one array.
+    samples: list of 1D arrays with the scores of every cell
+    returns the padded array (cells x max subjects) and the number of scores of every cell.
+    """
+    counts = np.array([len(s) for s in samples], dtype=np.int64)
+    padded = np.full((len(samples), max(counts.max(initial=0), 1)), np.nan)
+    for i, s in enumerate(samples):
+        padded[i, :len(s)] = s
+    return padded, counts
+
+
+def resample_means(args):
+    """
+    Means of one batch of resamples for all cells.
+    returns an array of cells x resamples.
+    """
+    padded, counts, n, seed = args
+    rng = np.random.default_rng(seed)
+    cells, max_n = padded.shape
+    # Index of the subject for every draw. Only the first counts[i] draws of
+    # cell i are used.
+    idx = np.floor(rng.random((cells, n, max_n)) * counts[:, None, None]).astype(np.int64)
+    values = np.take_along_axis(padded[:, None, :], idx, axis=2)
+    used = np.arange(max_n)[None, None, :] < counts[:, None, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(used, values, 0).sum(axis=2) / counts[:, None]
+
+
+def bootstrap(samples, n_resamples=n_resamples, confidence=confidence, processes=1, seed=0):
+    """
+    Percentile bootstrap CIs of the mean of every cell.
+    samples: list of 1D arrays with the per subject scores of every cell
+    n_resamples: number of bootstrap resamples
+    confidence: confidence level in %
+    processes: number of processes to spread the batches over
+    seed: seed of the random generator
+    returns the mean, the lower and the upper bound of the CI of every cell.
+    Cells without scores are nan.
+    """
+    padded, counts = pad([np.asarray(s, dtype=float) for s in samples])
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(padded, counts, n, s) for n, s in zip(sizes, seeds)]
+    if processes > 1:
+        with Pool(processes) as pool:
+            means = pool.map(resample_means, args)
+    else:
+        means = [resample_means(a) for a in args]
+    means = np.concatenate(means, axis=1)
+    alpha = (100 - confidence) / 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(counts > 0, np.nansum(padded, axis=1) / counts, np.nan)
+        lower, upper = np.percentile(means, [alpha, 100 - alpha], axis=1)
+    return mean, lower, upper
+
+
+def errorbars(mean, lower, upper):
+    """
+    The CI as asymmetric error bars for the yerr argument of plt.bar.
+    For a 2D mean (detectors x experiments) every row is in the
+    shape one call of plt.bar needs.
+    """
+    return np.stack((mean - lower, upper - mean), axis=-2)
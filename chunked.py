@@ -0,0 +1,99 @@
+"""
+Chunked evaluation
+==================
+JF analysis of recordings which are too long to run the detector over
+the whole signal at once, for example 24h multi-lead Holter files.
+
+The signal is read in chunks from a memory-mapped .npy file. Every chunk
+is extended by an overlap on both sides so that the detector has warmed
+up when it reaches the chunk and can look ahead past its end. A chunk
+only keeps the detections which fall inside of it and detections of the
+same beat from two neighbouring chunks are merged. The detections are
+collected chunk by chunk and then matched against the annotations by
+jf_analysis. Peak memory for the signal is set by the chunk size; the
+detections and annotations only need a few bytes per beat.
+"""
+import numpy as np
+import jf_analysis
+
+# Length of a chunk in s
+chunk_duration = 600
+
+# Signal added before and after a chunk for detector warm-up in s. Detectors
+# which adapt over longer times than this (for example Hamilton) give
+# slightly different detections near the chunk borders.
+overlap_duration = 30
+
+# Detections of two chunks closer than this are the same beat (s)
+refractory = 0.2
+
+
+def open_signal(fname, lead=0):
+    """
+    Memory-maps the ECG in the .npy file fname. Multi-lead files have the
+    shape (samples, leads) and lead selects the column, the first by default.
+    """
+    data = np.load(fname, mmap_mode="r")
+    if data.ndim > 1:
+        data = data[:, lead]
+    return data
+
+
+def chunks(nSamples, fs, chunk_duration=chunk_duration, overlap_duration=overlap_duration):
+    """
+    Generates the chunks of a recording as tuples of
+    (start of the read, start of the chunk, end of the chunk, end of the read).
+    """
+    chunk = int(chunk_duration * fs)
+    overlap = int(overlap_duration * fs)
+    for start in range(0, nSamples, chunk):
+        end = min(start + chunk, nSamples)
+        yield max(start - overlap, 0), start, end, min(end + overlap, nSamples)
+
+
+def detect(detectorfunc, data, fs, chunk_duration=chunk_duration, overlap_duration=overlap_duration, lead=0):
+    """
+    Runs the detector over the signal in chunks.
+    detectorfunc: detector which takes the ECG data and returns the R peaks in samples
+    data: ECG data, either an array (can be memory-mapped) or the file name of a .npy file
+    fs: sampling rate
+    lead: column of a multi-lead file
+    Generates the detections in samples chunk by chunk.
+    """
+    if isinstance(data, str):
+        data = open_signal(data, lead)
+    min_distance = int(refractory * fs)
+    last = None
+    for read_start, start, end, read_end in chunks(len(data), fs, chunk_duration, overlap_duration):
+        segment = np.array(data[read_start:read_end]) # only this chunk is loaded into memory
+        det = np.asarray(detectorfunc(segment), dtype=np.int64) + read_start
+        det = det[(det >= start) & (det < end)] # detections owned by this chunk
+        # the same beat detected at the end of the previous chunk
+        if last is not None:
+            det = det[det - last >= min_distance]
+        if len(det) > 0:
+            last = det[-1]
+        yield det
+
+
+def evaluate(detectorfunc, data, anno_R, fs, trim=True,
+             chunk_duration=chunk_duration, overlap_duration=overlap_duration, lead=0):
+    """
+    JF analysis of a detector where the detector is run in chunks.
+    detectorfunc: detector which takes the ECG data and returns the R peaks in samples
+    data: ECG data, either an array (can be memory-mapped) or the file name of a .npy file
+    anno_R: the ground truth in samples, either an array or the file name of a .npy file
+    fs: sampling rate of the ECG file
+    lead: column of a multi-lead file
+    returns the JFResult of jf_analysis.evaluate for the chunked detections.
+    It's the same as for the whole recording unless the detector adapts over
+    longer times than overlap_duration.
+    """
+    if isinstance(data, str):
+        data = open_signal(data, lead)
+    if isinstance(anno_R, str):
+        anno_R = np.load(anno_R)
+    if len(data) == 0:
+        raise ValueError("The signal is empty.")
+    det_posn = np.concatenate(list(detect(detectorfunc, data, fs, chunk_duration, overlap_duration)))
+    return jf_analysis.evaluate(det_posn, anno_R, fs, len(data), trim)
@@ -0,0 +1,145 @@
+"""
+Detector comparison
+===================
+Paired tests between all detectors over the same subjects. For k
+detectors the k x k matrix of p-values is calculated in one batched
+pass, optionally for many (leads, experiment) cells at once, and
+Holm-corrected for the multiple comparisons of each cell.
+
+Two tests are available:
+ - "permutation": paired sign-flip permutation test of the mean
+   difference. The sign flips are shared by all pairs and cells so that
+   every batch of permutations is a single matrix product.
+ - "wilcoxon": Wilcoxon signed-rank test (scipy), vectorised over pairs.
+
+Missing scores (nan) drop out of a pair: the difference is set to zero
+which doesn't change the permutation statistic and is ignored by the
+Wilcoxon test.
+"""
+import csv
+import numpy as np
+from scipy import stats
+
+# number of sign-flip permutations
+n_permutations = 10000
+
+# permutations per batch (limits memory to pairs x batch_size values)
+batch_size = 1000
+
+alpha = 0.05
+
+
+def differences(scores):
+    """
+    Paired differences of all pairs i < j of detectors.
+    scores: array (..., detectors, subjects) with nan for missing scores
+    returns the differences (..., pairs, subjects) and the pair indices i, j.
+    """
+    k = scores.shape[-2]
+    i, j = np.triu_indices(k, 1)
+    return scores[..., i, :] - scores[..., j, :], i, j
+
+
+def permutation_pvalues(d, n_permutations=n_permutations, seed=0):
+    """
+    Two sided p-values of the paired sign-flip permutation test.
+    d: differences (pairs, subjects) with nan for missing pairs
+    """
+    d = np.where(np.isnan(d), 0, d)
+    observed = np.abs(d.sum(axis=1))
+    # relative tolerance so that rounding doesn't hide ties with the observed value
+    tol = 1E-9 * np.abs(d).sum(axis=1)
+    rng = np.random.default_rng(seed)
+    count = np.zeros(len(d))
+    done = 0
+    while done < n_permutations:
+        n = min(batch_size, n_permutations - done)
+        flips = rng.choice(np.array([-1.0, 1.0]), size=(d.shape[1], n))
+        count += np.count_nonzero(np.abs(d @ flips) >= (observed - tol)[:, None], axis=1)
+        done += n
+    return (count + 1) / (n_permutations + 1)
+
+
+def wilcoxon_pvalues(d):
+    """
+    Two sided p-values of the Wilcoxon signed-rank test.
+    d: differences (pairs, subjects) with nan for missing pairs
+    """
+    p = np.full(len(d), np.nan)
+    # pairs with differences at all, the test is undefined otherwise
+    valid = np.any(np.nan_to_num(d) != 0, axis=1)
+    if np.any(valid):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            p[valid] = stats.wilcoxon(d[valid], axis=1, nan_policy="omit").pvalue
+    return p
+
+
+def holm(p):
+    """
+    Holm-Bonferroni correction of the p-values along the last axis.
+    nan values are ignored.
+    """
+    p = np.asarray(p, dtype=float)
+    m = np.count_nonzero(~np.isnan(p), axis=-1)[..., None]
+    order = np.argsort(np.where(np.isnan(p), np.inf, p), axis=-1)
+    ranked = np.take_along_axis(p, order, axis=-1)
+    adjusted = np.maximum.accumulate(np.nan_to_num(ranked * (m - np.arange(p.shape[-1])), nan=np.inf), axis=-1)
+    adjusted = np.where(np.isnan(ranked), np.nan, np.minimum(adjusted, 1))
+    corrected = np.empty_like(p)
+    np.put_along_axis(corrected, order, adjusted, axis=-1)
+    return corrected
+
+
+def pvalue_matrix(scores, test="permutation", correction=True, n_permutations=n_permutations, seed=0):
+    """
+    Matrix of the p-values of all pairs of detectors.
+    scores: array (..., detectors, subjects) of the per subject scores, nan for missing
+    test: "permutation" or "wilcoxon"
+    correction: Holm correction over the pairs of each cell
+    returns an array (..., detectors, detectors), the diagonal is nan.
+    """
+    scores = np.asarray(scores, dtype=float)
+    d, i, j = differences(scores)
+    shape = d.shape[:-1]
+    d = d.reshape(-1, d.shape[-1])
+    if test == "permutation":
+        p = permutation_pvalues(d, n_permutations, seed)
+    elif test == "wilcoxon":
+        p = wilcoxon_pvalues(d)
+    else:
+        raise ValueError("Unknown test: {}".format(test))
+    p = p.reshape(shape)
+    if correction:
+        p = holm(p)
+    k = scores.shape[-2]
+    matrix = np.full(scores.shape[:-2] + (k, k), np.nan)
+    matrix[..., i, j] = p
+    matrix[..., j, i] = p
+    return matrix
+
+
+def latex_table(matrix, names):
+    """
+    The p-value matrix as LaTeX table rows. Significant values are marked with a *.
+    """
+    lines = ["      & " + " & ".join(names) + " \\\\"]
+    for name, row in zip(names, matrix):
+        cells = []
+        for p in row:
+            if np.isnan(p):
+                cells.append("---")
+            else:
+                cells.append("{:03.2f}{}".format(p, "*" if p < alpha else ""))
+        lines.append(name + " & " + " & ".join(cells) + " \\\\")
+    return "\n".join(lines)
+
+
+def write_csv(fname, matrix, names):
+    """
+    Saves the p-value matrix with the detector names as header and first column.
+    """
+    with open(fname, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([""] + list(names))
+        for name, row in zip(names, matrix):
+            writer.writerow([name] + ["" if np.isnan(p) else p for p in row])
@@ -0,0 +1,85 @@
+"""
+Guard
+=====
+Runs a unit of work (one detector on one recording) in a fresh child
+process with a time and memory budget so that a detector which hangs,
+raises or runs out of memory on one recording only costs that unit and
+not the whole run.
+
+The memory budget limits the address space of the child
+(resource.RLIMIT_AS), a detector exceeding it gets a MemoryError. A
+child which exceeds the time budget is killed. Failed units are retried
+in a new process.
+"""
+import resource
+import traceback
+from multiprocessing import Process, Pipe
+
+# Time budget of a unit (s)
+time_budget = 300
+
+# Memory budget of a unit (MB), 0 for no limit
+memory_budget = 4096
+
+# Number of retries of a failed unit
+retries = 1
+
+
+def child(conn, func, args, megabytes):
+    """
+    Runs func(*args) in the child and sends (result, error) to the parent.
+    """
+    if megabytes > 0:
+        limit = int(megabytes * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        r = (func(*args), None)
+    except BaseException as e:
+        traceback.print_exc()
+        r = (None, "{}: {}".format(type(e).__name__, e))
+    conn.send(r)
+    conn.close()
+
+
+def attempt(func, args, seconds, megabytes):
+    """
+    One run of func(*args) in a new process.
+    returns (result, None) or (None, error message).
+    """
+    receiver, sender = Pipe(duplex=False)
+    p = Process(target=child, args=(sender, func, args, megabytes))
+    p.start()
+    sender.close() # so that the receiver sees the end if the child dies
+    try:
+        if receiver.poll(seconds):
+            r = receiver.recv()
+        else:
+            r = (None, "Timeout: no result after {} s".format(seconds))
+    except EOFError:
+        r = None
+    if p.is_alive():
+        p.kill()
+    p.join()
+    if r is None:
+        r = (None, "Crash: worker exited with code {}".format(p.exitcode))
+    receiver.close()
+    return r
+
+
+def run(func, args=(), seconds=None, megabytes=None, n_retries=None):
+    """
+    Runs func(*args) under the guard and retries it on failure.
+    seconds, megabytes, n_retries: time budget, memory budget and number of
+    retries, the module settings if None. The settings are read at every
+    call so they can be changed at runtime.
+    returns (result, None) on success or (None, error message) of the last attempt.
+    """
+    seconds = time_budget if seconds is None else seconds
+    megabytes = memory_budget if megabytes is None else megabytes
+    n_retries = retries if n_retries is None else n_retries
+    for i in range(n_retries + 1):
+        result, error = attempt(func, args, seconds, megabytes)
+        if error is None:
+            return result, None
+        print("Attempt {} of {} failed: {}".format(i + 1, n_retries + 1, error))
+    return None, error
@@ -28,35 +28,116 @@ key_tp = "TP" # True positives
 key_fp = "FP" # False positives
 key_fn = "FN" # False negatives
 
+
+class JFResult:
+    """
+    Result of evaluate(). A compact record which can be read like the
+    jf dict it replaces: jf[key_jitter], jf[key_tp], jf.keys(), dict(jf), ...
+    as_json() returns it as a real dict, for example for json.dumps().
+    """
+    __slots__ = ("jitter", "tp", "fp", "fn", "f1", "jf")
+
+    # dict keys in the order of __slots__
+    _keys = [key_jitter, key_tp, key_fp, key_fn, key_f1, key_jf]
+
+    # dict key -> slot
+    _slot = dict(zip(_keys, __slots__))
+
+    # NumPy dtypes of the fields for results.ResultTable
+    _fields = [("jitter", "f8"), ("tp", "i8"), ("fp", "i8"), ("fn", "i8"), ("f1", "f8"), ("jf", "f8")]
+
+    def __init__(self, jitter, tp, fp, fn, f1, jf):
+        self.jitter = jitter
+        self.tp = tp
+        self.fp = fp
+        self.fn = fn
+        self.f1 = f1
+        self.jf = jf
+
+    def __getitem__(self, key):
+        return getattr(self, self._slot[key])
+
+    def __contains__(self, key):
+        return key in self._slot
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(self.as_json())
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return [self[k] for k in self._keys]
+
+    def items(self):
+        return [(k, self[k]) for k in self._keys]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def row(self):
+        """
+        Field values for a table row. False and None are stored as nan.
+        """
+        return tuple(np.nan if v is False or v is None else v for v in (getattr(self, s) for s in self.__slots__))
+
+    @classmethod
+    def from_row(cls, row):
+        tp, fp, fn = int(row["tp"]), int(row["fp"]), int(row["fn"])
+        f1, jf = float(row["f1"]), float(row["jf"])
+        if (tp + fp + fn) == 0:
+            f1, jf = False, False
+        return cls(float(row["jitter"]), tp, fp, fn, f1, jf)
+
+    @classmethod
+    def from_json(cls, jf):
+        return cls(*[jf[k] for k in cls._keys])
+
+    @classmethod
+    def failed(cls):
+        """
+        Result of a unit which couldn't be evaluated, like one without beats.
+        """
+        return cls(float("nan"), 0, 0, 0, False, False)
+
+    def as_json(self):
+        """
+        The jf dict as stored in the results files. nan, like the jitter
+        without any beats, is stored as None (null) which is valid JSON.
+        """
+        return {k: None if isinstance(v, float) and np.isnan(v) else v
+                for k, v in self.items()}
+
 def nearest_diff(annotation, nearest_match):
     # Calculates the nearest difference between values in two arrays and saves
     # index and sample position of nearest
-    
-    len_annotation=len(annotation)
-
-    # Array which will contain matches for all annotations no matter if the actual detection is missing
-    used_indices=[] 
-    for i in range(len_annotation): # scan through 'source' peaks 
-        diff = nearest_match - annotation[i] # subtract ith source array value from ALL nearest match values
-        index = np.abs(diff).argmin() # return the index of the smallest difference value
-        used_indices.append((index,np.abs(nearest_match[index]-annotation[i]))) # save as tuple in used_indices
-
-    # Array which will contain unique instances by always choosing the one which has the shortest time
-    # difference.
-    # 
-    unique_diffs=[]
-    index_used=[]
-    for j in used_indices:
-        if not (j[0] in index_used):
-            uni = []
-            for k in used_indices:
-                if k[0] == j[0]:
-                    uni.append(k)
-            i = np.argmin(uni,0)[1]
-            unique_diffs.append(uni[i][1])
-            index_used.append(j[0])
-        
-    return unique_diffs
+
+    annotation = np.asarray(annotation)
+
+    # Equal detections count as one as np.argmin always picks the first of
+    # them. On a tie between two detections the one which comes first in
+    # nearest_match wins as with np.argmin so unsorted detections give the
+    # same matches.
+    values, first = np.unique(nearest_match, return_index=True)
+
+    # Matches for all annotations no matter if the actual detection is missing.
+    index, diffs = util.nearest(values, annotation, first)
+    matched = values[index]
+
+    # Unique instances by always choosing the one which has the shortest time
+    # difference, in the order they are first matched.
+    order = np.lexsort((diffs, matched)) # by detection, shortest difference first
+    starts = np.flatnonzero(np.diff(matched[order], prepend=np.nan) != 0)
+    unique_diffs = diffs[order][starts]
+    first_used = np.minimum.reduceat(order, starts) if len(starts) else starts
+
+    return unique_diffs[np.argsort(first_used)]
 
 
 def score(jitter,f1):
@@ -75,7 +156,7 @@ def evaluate(det_posn, anno_R, fs, nSamples, trim=True):
     anno_R: the ground truth in samples
     fs: sampling rate of the ECG file
     nSamples: number of samples in the ECG file
-    returns:
+    returns a JFResult with:
     jf[key_jitter]   : jitter in s
     jf[key_tp]       : true positive beats
     jf[key_fp]       : false positive beats
@@ -108,28 +189,18 @@ def evaluate(det_posn, anno_R, fs, nSamples, trim=True):
     # return anno / detector pairs
     anno_det_pairs = nearest_diff(anno_R, det_posn) 
     
-    differences_for_jitter=[]
-        
-    for d in anno_det_pairs: 
-
-        difference = np.abs(d / fs)
-        differences_for_jitter.append(difference)
-
-    jf = {}
+    differences_for_jitter = np.abs(anno_det_pairs / fs)
 
-    jf[key_jitter] = stats.median_abs_deviation(differences_for_jitter)
+    jitter = stats.median_abs_deviation(differences_for_jitter)
     fp = len_det_posn - len(differences_for_jitter) # all detections - true positive = false positive
     fn = len_anno_R - len(differences_for_jitter) # all detections
     tp = len(differences_for_jitter)
-    jf[key_tp] = tp
-    jf[key_fp] = fp
-    jf[key_fn] = fn
     if (tp + fp + fn) > 0:
         f1 = (2*tp)/(2*tp + fp + fn)
-        jf[key_f1] = f1
-        jf[key_jf] = score(jf[key_jitter],f1)
+        jf_score = score(jitter,f1)
     else:
-        jf[key_f1] = False
-        jf[key_jf] = False
+        f1 = False
+        jf_score = False
+    jf = JFResult(float(jitter), tp, fp, fn, f1, jf_score)
     print(jf)
     return jf
@@ -2,17 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 This code will run all subjects, all experiments, all leads recordings through
-all detectors or a single detector when specified.
+all detectors or the detectors specified by name or index.
+
+Detectors are taken from registry.py which has the detectors of
+ecgdetectors and any detectors registered by plugin modules. The
+detectors of one process are evaluated as a batch: every recording is
+loaded once and then run through all of them.
+
+python jf_evaluate_all_detectors.py                         # all detectors, one process each
+python jf_evaluate_all_detectors.py 3 my_detector           # by index or name
+python jf_evaluate_all_detectors.py --plugins my_detectors  # imports my_detectors.py first
+python jf_evaluate_all_detectors.py --time-budget 600 --memory-budget 0  # budget of every unit
 """
 
-import sys
 import os
-import numpy as np
-import json
+import argparse
 from ecg_gudb_database import GUDb
-from ecgdetectors import Detectors
 import pathlib # For local file use
 from multiprocessing import Process
+import results
+import recordings
+import registry
+import guard
 
 # The JF analysis for a detector
 import jf_analysis
@@ -28,113 +39,159 @@ except OSError as error:
 # Get the sampling rate
 fs = GUDb.fs
 
-# Get an instance of all detectors
-detectors = Detectors(fs)
-
 current_dir = pathlib.Path(__file__).resolve()
 
 # Detectors, recording leads and experiments can be added/removed from lists as required
 all_recording_leads=["einthoven_ii", "chest_strap_V2_V1"] # can be expanded if required
 all_experiments = ["sitting","maths","walking","hand_bike","jogging"]
 
-def evaluate_detector(detector):
-
-    detectorname = detector[1].__name__
+# (subject_number, experiment, record_lead) -> (data, annotations) of the
+# recordings loaded by evaluate_detectors() so that repeated calls in one
+# process, for example while tuning a detector, don't read them again.
+# Call recording_cache.clear() to free them.
+recording_cache = {}
+
+def find_detector(detectorname):
+    """
+    Finds a registered detector by its name or index.
+    """
+    return registry.get(detectorname)
+
+
+def evaluate_unit(detector, record_lead, experiment, subject_number, recording=None):
+    """
+    Runs one subject, experiment and lead through a detector.
+    recording: the (data, annotations) of the unit if already loaded
+    returns the JFResult or None if no annotations exist.
+    """
     detectorfunc = detector[1]
-    
-    print("Processing:",detector[0])
-
-    analysed=0 # overall count of analysed subjects
 
-    jf_leads = {} # initialise for data to be saved by lead and detector
+    print("Analysing subject {}, {}, {}, {}".format(subject_number, experiment, record_lead, detector[0]))
+
+    # loads the recording from the local cache or online GUDB access
+    if recording is None:
+        recording = recordings.load(subject_number, experiment, record_lead)
+    data, data_anno = recording
+
+    if data_anno is None:
+        if 'chest' in record_lead:
+            print("No chest strap annotations exist for subject %d, %s exercise" %(subject_number, experiment))
+        else:
+            print("No cables annotations exist for subject %d, %s exercise" %(subject_number, experiment))
+        return None
+
+    #%% Detection
+
+    ### Applying detector to each subject ECG data set then correct for mean detector
+    # delay as referenced to annotated R peak position
+    # Note: the correction factor for each detector doesn't need to be exact,
+    # but centres the detection point for finding the nearest annotated match
+    # It may/will be different for different subjects and experiments
+
+    detected_peaks = detectorfunc(data) # call detector class for current detector
+    return jf_analysis.evaluate(detected_peaks, data_anno, fs, len(data)) # perform interval based analysis
+
+
+def run_unit(detector, record_lead, experiment, subject_number, recording=None):
+    """
+    Runs evaluate_unit() in a child process under the time and memory
+    budget of guard.py and retries it once if it fails.
+    returns (JFResult or None, None) or (JFResult.failed(), error message)
+    if the unit has failed.
+    """
+    jf_result, error = guard.run(evaluate_unit, (detector, record_lead, experiment, subject_number, recording))
+    if error is not None:
+        print("Failed subject {}, {}, {}, {}: {}".format(subject_number, experiment, record_lead, detector[0], error))
+        return jf_analysis.JFResult.failed(), error
+    return jf_result, None
+
+
+def load_recording(subject_number, experiment, record_lead, keep=True):
+    """
+    Loads a recording from recording_cache or from recordings.load().
+    keep: stores the recording in recording_cache
+    """
+    key = (subject_number, experiment, record_lead)
+    if key in recording_cache:
+        return recording_cache[key]
+    recording = recordings.load(subject_number, experiment, record_lead)
+    if keep:
+        recording_cache[key] = recording
+    return recording
+
+
+def evaluate_detectors(detector_list, keep=True):
+    """
+    Evaluates a batch of detectors. Every recording is loaded once and
+    run through all detectors of the batch.
+    keep: keeps the recordings in memory for the next call (see recording_cache)
+    """
+    print("Processing:",", ".join([detector[0] for detector in detector_list]))
+
+    detectornames = [detector[1].__name__ for detector in detector_list]
+
+    analysed=0 # overall count of analysed units
+    failed=0 # units which timed out or raised
+
+    table = results.ResultTable(jf_analysis.JFResult) # results of all detectors, leads, experiments and subjects
 
     for record_lead in all_recording_leads: # loop for all chosen leads
         
-        jf_experiments = {}
-        
         for experiment in all_experiments: # loop for all chosen experiments
             
-            jf_subjects=[]
-            
             for subject_number in range(0, 25): # loop for all subjects
+
+                # shared by all detectors
+                recording = load_recording(subject_number, experiment, record_lead, keep)
+
+                for detector, detectorname in zip(detector_list, detectornames): # loop for all detectors
                 
-                print("Analysing subject {}, {}, {}, {}".format(subject_number, experiment, record_lead, detector[0]))
-    
-                # creating class which loads the experiment
-        
-                # For online GUDB access
-                ecg_class = GUDb(subject_number, experiment)
-            
-                # For local GUDB file access:
-                # from ecg_gla_database import Ecg # For local file use
-                # data_path = str(pathlib.Path(__file__).resolve().parent.parent/'experiment_data')
-                # ecg_class = Ecg(data_path, subject_number, experiment)
-                
-                # getting the raw ECG data numpy arrays from class
-                chest_strap_V2_V1 = ecg_class.cs_V2_V1
-                einthoven_i = ecg_class.einthoven_I
-                einthoven_ii = ecg_class.einthoven_II
-                einthoven_iii = ecg_class.einthoven_III
-        
-                # getting filtered ECG data numpy arrays from class
-                ecg_class.filter_data()
-                chest_strap_V2_V1_filt = ecg_class.cs_V2_V1_filt
-                einthoven_i_filt = ecg_class.einthoven_I_filt
-                einthoven_ii_filt = ecg_class.einthoven_II_filt
-                einthoven_iii_filt = ecg_class.einthoven_III_filt
-            
-                data=eval(record_lead) # set data array (i.e. recording to be processed)
-               
-                if 'chest' in record_lead:
-                    if ecg_class.anno_cs_exists:
-                        data_anno = ecg_class.anno_cs
-                        exist=True
+                    jf_result, error = run_unit(detector, record_lead, experiment, subject_number, recording)
+                    if jf_result is not None: # only if an annotation exists
+                        table.append(detectorname, record_lead, experiment, subject_number, jf_result, error)
                         analysed=analysed+1
-                    else:
-                        exist=False
-                        print("No chest strap annotations exist for subject %d, %s exercise" %(subject_number, experiment))
-                else:
-                    if ecg_class.anno_cables_exists:
-                        data_anno = ecg_class.anno_cables
-                        exist=True
-                        analysed=analysed+1
-                    else:
-                        exist=False
-                        print("No cables annotations exist for subject %d, %s exercise" %(subject_number, experiment))
-                        
-                #%% Detection
-        
-                ### Applying detector to each subject ECG data set then correct for mean detector
-                # delay as referenced to annotated R peak position
-                # Note: the correction factor for each detector doesn't need to be exact,
-                # but centres the detection point for finding the nearest annotated match
-                # It may/will be different for different subjects and experiments
-
-                if exist==True: # only proceed if an annotation exists
-                    detected_peaks = detectorfunc(data) # call detector class for current detector
-                    jf_result = jf_analysis.evaluate(detected_peaks, data_anno, fs, len(data)) # perform interval based analysis
-                    jf_subjects.append(jf_result)
+                        if error is not None:
+                            failed=failed+1
+                        # checkpoint
+                        results.write_json(resultsdir+"/jf_"+detectorname+".json",
+                                           table.to_json(detectorname, all_recording_leads, all_experiments))
+
+                # ^ LOOP AROUND FOR NEXT DETECTOR
                     
             # ^ LOOP AROUND FOR NEXT SUBJECT
-
-            jf_experiments[experiment] = jf_subjects
                         
         # ^ LOOP AROUND FOR NEXT EXPERIMENT
         
-        # Add data for analysis by lead to (full array) 'data_det_lead' dictionary
-        
-        jf_leads[record_lead] = jf_experiments
-        
     # ^ LOOP AROUND FOR NEXT LEAD
-    serialized_data = json.dumps(jf_leads,indent="\t")
-    f = open(resultsdir+"/jf_"+detectorname+".json","w")
-    f.write(serialized_data)
-    f.close
-
-
-if (len(sys.argv)>1):
-    evaluate_detector(detectors.detector_list[int(sys.argv[1])])
-else:
-    for detector in detectors.detector_list:
-        pEvalDet = Process(target=evaluate_detector, args=(detector,))
-        pEvalDet.start()
+    for detectorname in detectornames:
+        results.write_json(resultsdir+"/jf_"+detectorname+".json",
+                           table.to_json(detectorname, all_recording_leads, all_experiments))
+    print("{}: {} units analysed, {} failed".format(", ".join(detectornames), analysed, failed))
+
+
+def evaluate_detector(detector, keep=False):
+    evaluate_detectors([detector], keep)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JF evaluation of all or the given detectors.")
+    parser.add_argument("detectors", nargs="*", help="names or indices of registered detectors (default: all)")
+    parser.add_argument("--plugins", nargs="+", default=[], help="modules which register detectors")
+    parser.add_argument("--batch", action="store_true", help="all detectors in one process")
+    parser.add_argument("--time-budget", type=float, default=guard.time_budget, help="time budget of a unit in s")
+    parser.add_argument("--memory-budget", type=float, default=guard.memory_budget, help="memory budget of a unit in MB, 0 for no limit")
+    args = parser.parse_args()
+
+    guard.time_budget = args.time_budget
+    guard.memory_budget = args.memory_budget
+    registry.load_plugins(args.plugins)
+    if args.detectors:
+        detector_list = [registry.get(d) for d in args.detectors]
+    else:
+        detector_list = registry.detector_list()
+    if args.batch or len(detector_list) == 1:
+        evaluate_detectors(detector_list, keep=False)
+    else:
+        for detector in detector_list:
+            pEvalDet = Process(target=evaluate_detector, args=(detector,))
+            pEvalDet.start()
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import scipy.stats as stats
 from ecgdetectors import Detectors
 import json
+import bootstrap
 import sys
 
 experiment_names = ['sitting','maths','walking','hand_bike','jogging']
@@ -42,6 +43,25 @@ def get_result(det, leads):
     return m,s
 
 
+def get_cis(dets, leads):
+    """
+    Bootstrap CIs of the mean JF of the detectors for all experiments at once.
+    returns the mean, lower and upper bound as detectors x experiments arrays.
+    """
+    return cis([[get_jf(det, leads, e) for e in experiment_names] for det in dets])
+
+
+def cis(scores):
+    """
+    Bootstrap CIs of the mean JF of every detector in every experiment.
+    scores: for every detector a list with the JF scores of every experiment
+    returns the mean, lower and upper bound as detectors x experiments arrays.
+    """
+    m, l, u = bootstrap.bootstrap([s for det in scores for s in det])
+    shape = (len(scores), len(experiment_names))
+    return m.reshape(shape), l.reshape(shape), u.reshape(shape)
+
+
 def print_stat(p):
     if p == None:
         print('--- & ',end='')
@@ -53,13 +73,19 @@ def print_stat(p):
 
     
 def calc_stats(det,leads):
+    print_stats([get_jf(det, leads, e) for e in experiment_names], det, leads)
+
+
+def print_stats(scores, det, leads):
+    """
+    One sample t-tests of the JF of a detector in every experiment against minjf as LaTeX.
+    """
     print("Stats:",det, leads)
     print("      & ",end='')
     for e in experiment_names:
         print(e," & ",end='')
     print("\\\\")
-    for e in experiment_names:
-        r1 = get_jf(det, leads, e)
+    for r1 in scores:
         t,p = stats.ttest_1samp(r1,minjf,alternative='greater')
         print_stat(p)
     print()
@@ -92,36 +118,45 @@ dets.append(det_names[0])
 dets.append(det_names[7])
 dets.append(det_names[6])
 
-helpstr = "Valid arguments are 'einth' for Einthoven or 'cs' for Chest Strap."
-
-leads = einth
-if len(sys.argv) > 1:
-    if ('einth' in sys.argv[1]):
-        leads = einth
-    elif ('cs' in sys.argv[1]):
-        leads = cs
+if __name__ == "__main__":
+    helpstr = "Valid arguments are 'einth' for Einthoven or 'cs' for Chest Strap."
+
+    leads = einth
+    if len(sys.argv) > 1:
+        if ('einth' in sys.argv[1]):
+            leads = einth
+        elif ('cs' in sys.argv[1]):
+            leads = cs
+        else:
+            print(helpstr)
+            print("Exiting...")
+            quit()
     else:
         print(helpstr)
-        print("Exiting...")
-        quit()
-else:
-    print(helpstr)
 
-print("Leads:",leads)
-print("Dets:",dets)
+    print("Leads:",leads)
+    print("Dets:",dets)
+
+    avg = []
+    std = []
+    for d in dets:
+        a,s = get_result(d, leads)
+        avg.append(a)
+        std.append(s)
+
+    ci_mean, ci_lower, ci_upper = get_cis(dets, leads)
 
-avg = []
-std = []
-for d in dets:
-    a,s = get_result(d, leads)
-    avg.append(a)
-    std.append(s)
+    for d, lower, upper in zip(dets, ci_lower, ci_upper):
+        print("JF Score {}% CI:".format(bootstrap.confidence), d)
+        for i in zip(experiment_names, lower, upper):
+            print("{}: [{:1.1f}, {:1.1f}]".format(i[0],i[1],i[2]))
+        print()
 
-multi_plot(avg,std,
-        'JF (%)', dets, leads)
+    multi_plot(avg,bootstrap.errorbars(ci_mean, ci_lower, ci_upper),
+            'JF (%)', dets, leads)
 
 
-for d in dets:
-    calc_stats(d, leads)
+    for d in dets:
+        calc_stats(d, leads)
 
-plt.show()
+    plt.show()
@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 import scipy.stats as stats
 from ecgdetectors import Detectors
 import json
+import bootstrap
+import comparison
 
 experiment_names = ['sitting','maths','walking','hand_bike','jogging']
 
@@ -31,6 +33,17 @@ def get_jf(detector_name, leads, experiment):
     return np.array(s)
 
 
+def get_jf_subjects(detector_name, leads, experiment):
+    """
+    JF in % of every subject in the order of the results file. nan where no
+    JF could be calculated so that the subjects of all detectors line up.
+    """
+    f = open(resultsdir+"/jf_"+detector_name+".json","r")
+    data = json.loads(f.read())
+    f.close()
+    return np.array([i["jf"]*100 if i["jf"] else np.nan for i in data[leads][experiment]])
+
+
 def get_result(det, leads, experiment):
     
     m = []
@@ -43,6 +56,26 @@ def get_result(det, leads, experiment):
     return np.array(m),np.array(s)
 
 
+def get_cis(cells):
+    """
+    Bootstrap CIs of the mean of all detectors for all (leads, experiment)
+    cells at once.
+    returns the mean, lower and upper bound as cells x detectors arrays.
+    """
+    return cis([[get_jf(det, leads, experiment) for det in det_names] for leads, experiment in cells])
+
+
+def cis(scores):
+    """
+    Bootstrap CIs of the mean of the scores of every detector in every cell.
+    scores: for every cell a list with the scores of every detector
+    returns the mean, lower and upper bound as cells x detectors arrays.
+    """
+    m, l, u = bootstrap.bootstrap([s for cell in scores for s in cell])
+    shape = (len(scores), len(det_names))
+    return m.reshape(shape), l.reshape(shape), u.reshape(shape)
+
+
 def print_stat(p):
     if p == None:
         print('--- & ',end='')
@@ -54,18 +87,59 @@ def print_stat(p):
 
     
 def calc_stats(leads, experiment):
+    print_stats([get_jf(det1, leads, experiment) for det1 in det_names], leads, experiment)
+
+
+def print_stats(scores, leads, experiment):
+    """
+    One sample t-tests of the scores of every detector against minja as LaTeX.
+    """
     print("Stats:",leads, experiment)
     print("      & ",end='')
     for det1 in det_names:
         print(det1," & ",end='')
     print("\\\\")
-    for det1 in det_names:
-        r1 = get_jf(det1, leads, experiment)
+    for r1 in scores:
         t,p = stats.ttest_1samp(r1,minja,alternative='greater')
         print_stat(p)
     print()
 
     
+def calc_pair_stats(all_leads, experiments, test="permutation"):
+    """
+    Paired comparison of all detectors against each other for every lead and
+    experiment in one pass. Prints the Holm corrected p-value matrices as
+    LaTeX and saves them as CSV in the results directory.
+    """
+    jf = [[[get_jf_subjects(det, leads, e) for det in det_names] for e in experiments] for leads in all_leads]
+    p = print_pair_stats(jf, all_leads, experiments, test)
+    for i, leads in enumerate(all_leads):
+        for j, experiment in enumerate(experiments):
+            comparison.write_csv(resultsdir+"/jf_pairs_"+leads+"_"+experiment+".csv", p[i, j], det_names)
+
+
+def print_pair_stats(jf, all_leads, experiments, test="permutation"):
+    """
+    Prints the Holm corrected p-value matrices of all leads and experiments as LaTeX.
+    jf: for every lead and experiment a list with the JF of every subject
+        and detector, nan where there's no JF
+    returns the p-value matrices as an array (leads, experiments, detectors, detectors).
+    """
+    n = max(len(s) for l in jf for e in l for s in e)
+    scores = np.full((len(all_leads), len(experiments), len(det_names), n), np.nan)
+    for i, l in enumerate(jf):
+        for j, e in enumerate(l):
+            for k, s in enumerate(e):
+                scores[i, j, k, :len(s)] = s
+    p = comparison.pvalue_matrix(scores, test)
+    for i, leads in enumerate(all_leads):
+        for j, experiment in enumerate(experiments):
+            print("Pairwise {} stats:".format(test), leads, experiment)
+            print(comparison.latex_table(p[i, j], det_names))
+            print()
+    return p
+
+
 def double_plot(data1, std1, data2, std2, y_label, legend1, legend2, title=None):
     fig, ax = plt.subplots()
     x_pos = np.arange(len(plot_names))
@@ -89,6 +163,13 @@ def double_plot(data1, std1, data2, std2, y_label, legend1, legend2, title=None)
     return rects1, rects2
 
 
+def print_ci(title,lower,upper,legend):
+    print("JF Score {}% CI:".format(bootstrap.confidence),title)
+    for i in zip(legend,lower,upper):
+        print("{}: [{:1.1f}, {:1.1f}]".format(i[0],i[1],i[2]))
+    print()
+
+
 def print_result(title,data,std,legend):
     print("JF Score:",title)
     for i in zip(legend,data,std):
@@ -96,39 +177,54 @@ def print_result(title,data,std,legend):
     print()
 
 
-cs_sitting_avg,cs_sitting_std = get_result(det_names, cs, 'sitting')
-einthoven_sitting_avg,einthoven_sitting_std = get_result(det_names, einth, 'sitting')
+if __name__ == "__main__":
+    cs_sitting_avg,cs_sitting_std = get_result(det_names, cs, 'sitting')
+    einthoven_sitting_avg,einthoven_sitting_std = get_result(det_names, einth, 'sitting')
+
+    cs_jogging_avg,cs_jogging_std = get_result(det_names, cs, 'jogging')
+    einthoven_jogging_avg,einthoven_jogging_std = get_result(det_names, einth, 'jogging')
+
 
-cs_jogging_avg,cs_jogging_std = get_result(det_names, cs, 'jogging')
-einthoven_jogging_avg,einthoven_jogging_std = get_result(det_names, einth, 'jogging')
+    print_result('sitting Einthoven',einthoven_sitting_avg,einthoven_sitting_std,det_names)
+    print_result('jogging Einthoven',einthoven_jogging_avg,einthoven_jogging_std,det_names)
 
+    print_result('sitting chest strap',cs_sitting_avg,cs_sitting_std,det_names)
+    print_result('jogging chest strap',cs_jogging_avg,cs_jogging_std,det_names)
 
-print_result('sitting Einthoven',einthoven_sitting_avg,einthoven_sitting_std,det_names)
-print_result('jogging Einthoven',einthoven_jogging_avg,einthoven_jogging_std,det_names)
+    ci_cells = [(einth,'sitting'), (einth,'jogging'), (cs,'sitting'), (cs,'jogging')]
+    ci_mean, ci_lower, ci_upper = get_cis(ci_cells)
+    ci_err = bootstrap.errorbars(ci_mean, ci_lower, ci_upper)
 
-print_result('sitting chest strap',cs_sitting_avg,cs_sitting_std,det_names)
-print_result('jogging chest strap',cs_jogging_avg,cs_jogging_std,det_names)
+    print_ci('sitting Einthoven',ci_lower[0],ci_upper[0],det_names)
+    print_ci('jogging Einthoven',ci_lower[1],ci_upper[1],det_names)
 
+    print_ci('sitting chest strap',ci_lower[2],ci_upper[2],det_names)
+    print_ci('jogging chest strap',ci_lower[3],ci_upper[3],det_names)
 
 
-double_plot(einthoven_sitting_avg, einthoven_sitting_std,
-            einthoven_jogging_avg,einthoven_jogging_std,
-            'JF (%)', 'Sitting', 'Jogging', 'Einthoven')
 
+    double_plot(einthoven_sitting_avg, ci_err[0],
+                einthoven_jogging_avg, ci_err[1],
+                'JF (%)', 'Sitting', 'Jogging', 'Einthoven')
 
-double_plot(cs_sitting_avg, cs_sitting_std,
-            cs_jogging_avg, cs_jogging_std,
-            'JF (%)', 'Sitting', 'Jogging', 'Chest strap')
 
+    double_plot(cs_sitting_avg, ci_err[2],
+                cs_jogging_avg, ci_err[3],
+                'JF (%)', 'Sitting', 'Jogging', 'Chest strap')
 
 
-calc_stats(einth,"sitting")
-calc_stats(einth,"jogging")
 
-print()
+    calc_stats(einth,"sitting")
+    calc_stats(einth,"jogging")
+
+    print()
+
+    calc_stats(cs,"sitting")
+    calc_stats(cs,"jogging")
+
+    print()
 
-calc_stats(cs,"sitting")
-calc_stats(cs,"jogging")
+    calc_pair_stats([einth, cs], experiment_names)
 
 
-plt.show()
+    plt.show()
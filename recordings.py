@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+"""
+Recordings
+==========
+Loads the ECG of one lead and its annotations for a subject and experiment
+of the GUDb database. Every recording is stored in the cache directory the
+first time it is loaded so that later runs don't need to download it again.
+
+Run this script to fill the cache with all subjects, experiments and leads.
+"""
+import os
+import socket
+import numpy as np
+
+# directory where the recordings are cached
+cachedir = "cache"
+
+fs = 250 # sampling rate of GUDb
+
+all_recording_leads = ["einthoven_i", "einthoven_ii", "einthoven_iii", "chest_strap_V2_V1"]
+all_experiments = ["sitting","maths","walking","hand_bike","jogging"]
+n_subjects = 25
+
+# GUDb attribute of every lead. Append "_filt" to the lead for the filtered data.
+lead_attributes = {
+    "chest_strap_V2_V1": "cs_V2_V1",
+    "einthoven_i": "einthoven_I",
+    "einthoven_ii": "einthoven_II",
+    "einthoven_iii": "einthoven_III",
+}
+
+
+def cache_file(subject_number, experiment, record_lead):
+    return os.path.join(cachedir, "{}-{:02d}-{}.npz".format(experiment, subject_number, record_lead))
+
+
+def fetch(subject_number, experiment, record_lead):
+    """
+    Loads a recording from GUDb.
+    returns the ECG data and the annotations or None if no annotations exist.
+    """
+    from ecg_gudb_database import GUDb
+    ecg_class = GUDb(subject_number, experiment)
+    if record_lead.endswith("_filt"):
+        ecg_class.filter_data()
+        data = getattr(ecg_class, lead_attributes[record_lead[:-len("_filt")]] + "_filt")
+    else:
+        data = getattr(ecg_class, lead_attributes[record_lead])
+    data_anno = None
+    if 'chest' in record_lead:
+        if ecg_class.anno_cs_exists:
+            data_anno = ecg_class.anno_cs
+    else:
+        if ecg_class.anno_cables_exists:
+            data_anno = ecg_class.anno_cables
+    return np.asarray(data), data_anno
+
+
+def load(subject_number, experiment, record_lead, download=True):
+    """
+    Loads a recording from the cache or from GUDb if it's not cached yet.
+    subject_number: 0..24
+    experiment: one of all_experiments
+    record_lead: one of all_recording_leads with an optional "_filt" suffix
+    download: if False only the cache is used and None is returned for
+              recordings which are not cached
+    returns the ECG data and the annotations or None if no annotations exist.
+    """
+    fname = cache_file(subject_number, experiment, record_lead)
+    if os.path.exists(fname):
+        with np.load(fname) as f:
+            data_anno = f["anno"] if f["anno_exists"] else None
+            return f["data"], data_anno
+    if not download:
+        return None
+    data, data_anno = fetch(subject_number, experiment, record_lead)
+    try:
+        os.mkdir(cachedir)
+    except OSError as error:
+        pass
+    # Written to a temporary file first so that other processes loading the
+    # same recording never see a half written cache file.
+    tmp = "{}.{}.{}.tmp".format(fname, socket.gethostname(), os.getpid())
+    with open(tmp, "wb") as f:
+        np.savez(f, data=data,
+                 anno=np.array([] if data_anno is None else data_anno, dtype=np.int64),
+                 anno_exists=data_anno is not None)
+    os.replace(tmp, fname)
+    return data, data_anno
+
+
+def cached():
+    """
+    returns (subject_number, experiment, record_lead) of all cached recordings.
+    """
+    if not os.path.isdir(cachedir):
+        return []
+    r = []
+    for fname in sorted(os.listdir(cachedir)):
+        if not fname.endswith(".npz"):
+            continue
+        experiment, subject, record_lead = fname[:-len(".npz")].split("-")
+        r.append((int(subject), experiment, record_lead))
+    return r
+
+
+if __name__ == "__main__":
+    for experiment in all_experiments:
+        for subject_number in range(n_subjects):
+            for record_lead in all_recording_leads:
+                print("Caching subject {}, {}, {}".format(subject_number, experiment, record_lead))
+                load(subject_number, experiment, record_lead)
@@ -0,0 +1,85 @@
+"""
+Registry
+========
+Detectors which can be benchmarked, by name. The detectors of
+ecgdetectors are registered under their function names. Own detectors
+and parameterised variants of existing ones are added with register():
+
+    import registry
+    registry.register("my_detector", my_detector, "My detector")
+    registry.register("swt_mwa_convolve", registry.get("swt_detector")[1],
+                      "SWT with convolution MWA", MWA_name="convolve")
+
+A detector is a function which takes the ECG and returns the sample
+positions of the R peaks. Every entry is a (title, function) tuple like
+the entries of Detectors.detector_list and the function's __name__ is the
+registered name so that the results are saved as results/jf_<name>.json.
+
+Detectors can also be registered by a plugin module which calls
+register() when it's imported, see load_plugins().
+"""
+import functools
+import importlib
+from ecgdetectors import Detectors
+
+import recordings
+
+# name -> (title, function)
+detectors = {}
+
+
+def register(name, func, title=None, **params):
+    """
+    Registers a detector under name. A detector with the same name is replaced.
+    func: detector function, called with the ECG
+    title: name in the plots, the name by default
+    params: keyword arguments which are always passed to func
+    returns the registered (title, function) entry.
+    """
+    detector = functools.partial(func, **params)
+    detector.__name__ = name
+    detectors[name] = (title or name, detector)
+    return detectors[name]
+
+
+def unregister(name):
+    del detectors[name]
+
+
+def names():
+    return list(detectors)
+
+
+def detector_list():
+    """
+    All registered detectors as (title, function) in the order of registration.
+    """
+    return list(detectors.values())
+
+
+def get(detector):
+    """
+    A registered detector by its name or its index (also as string) in detector_list().
+    """
+    if detector in detectors:
+        return detectors[detector]
+    try:
+        return detector_list()[int(detector)]
+    except (ValueError, IndexError):
+        raise ValueError("Unknown detector: {}".format(detector))
+
+
+def load_plugins(modules):
+    """
+    Imports the plugin modules which register their detectors.
+    """
+    for module in modules:
+        importlib.import_module(module)
+
+
+def register_builtins(fs=recordings.fs):
+    for title, func in Detectors(fs).detector_list:
+        register(func.__name__, func, title)
+
+
+register_builtins()
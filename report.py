@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+"""
+Report
+======
+Renders all figures and LaTeX tables of the stats scripts without a
+display (Agg backend) in a process pool. The stats and plots are done by
+the functions of the stats scripts which take the score arrays.
+
+The results files are first condensed into one aggregate file with the
+per subject scores of every detector, lead and experiment. It's only
+rebuilt when a results file has changed. Every figure and table has its
+own digest of the aggregate data it uses and is only redrawn when that
+digest differs from the last build (or the output is missing).
+
+python report.py [--processes 4] [--force]
+"""
+import os
+import io
+import json
+import hashlib
+import argparse
+import contextlib
+from multiprocessing import Pool
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+import bootstrap
+import results
+import jf_stats_detectors
+import jf_stats_activities
+import sensitivity_stats_plots
+
+resultsdir = jf_stats_detectors.resultsdir
+
+aggregate_file = os.path.join(resultsdir, "aggregate.json")
+manifest_file = os.path.join(resultsdir, "report_manifest.json")
+
+det_names = jf_stats_detectors.det_names
+experiment_names = jf_stats_detectors.experiment_names
+einth = jf_stats_detectors.einth
+cs = jf_stats_detectors.cs
+
+# keys of the aggregate
+key_inputs = "inputs" # digests of the results files
+key_jf = "jf" # JF in % of every subject, None where it couldn't be calculated
+key_sens = "sens" # sensitivity in % of every subject
+
+
+def file_digest(fname):
+    with open(fname, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def data_digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def result_files():
+    """
+    returns the results files of all detectors with their kind.
+    """
+    files = []
+    for det in det_names:
+        for kind in (key_jf, key_sens):
+            fname = os.path.join(resultsdir, kind+"_"+det+".json")
+            if os.path.exists(fname):
+                files.append((kind, det, fname))
+    return files
+
+
+def build_aggregate():
+    """
+    Loads the aggregate and rebuilds it if any results file has changed.
+    """
+    files = result_files()
+    inputs = {fname: file_digest(fname) for kind, det, fname in files}
+    if os.path.exists(aggregate_file):
+        with open(aggregate_file, "r") as f:
+            aggregate = json.loads(f.read())
+        if aggregate[key_inputs] == inputs:
+            return aggregate
+    print("Building", aggregate_file)
+    aggregate = {key_inputs: inputs, key_jf: {}, key_sens: {}}
+    for kind, det, fname in files:
+        with open(fname, "r") as f:
+            data = json.loads(f.read())
+        scores = {}
+        for leads, experiments in data.items():
+            scores[leads] = {}
+            for experiment, subjects in experiments.items():
+                if kind == key_jf:
+                    scores[leads][experiment] = [i["jf"]*100 if i["jf"] else None for i in subjects]
+                else:
+                    scores[leads][experiment] = [None if i[0] is False else i[0] for i in subjects]
+        aggregate[kind][det] = scores
+    results.write_json(aggregate_file, aggregate)
+    return aggregate
+
+
+def subset(aggregate, kind, dets, leads, experiments):
+    """
+    The part of the aggregate an output depends on. It's sent to the worker
+    and its digest decides if the output has to be redrawn.
+    """
+    data = {key_jf: {}, key_sens: {}}
+    for det in dets:
+        s = aggregate[kind].get(det, {})
+        data[kind][det] = {l: {e: s.get(l, {}).get(e, []) for e in experiments} for l in leads}
+    return data
+
+
+def scores(data, kind, det, leads, experiment):
+    """
+    The valid scores of a detector as the stats scripts use them.
+    """
+    return np.array([i for i in data[kind][det][leads][experiment] if i is not None], dtype=float)
+
+
+def subjects(data, kind, det, leads, experiment):
+    """
+    The scores of every subject, nan where there's no score.
+    """
+    return np.array([np.nan if i is None else i for i in data[kind][det][leads][experiment]], dtype=float)
+
+
+def stats_module(kind):
+    return jf_stats_detectors if kind == key_jf else sensitivity_stats_plots
+
+
+def printed(func, *args):
+    """
+    returns what func(*args) prints, for the LaTeX tables.
+    """
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        func(*args)
+    return out.getvalue()
+
+
+def double_plot_task(data, kind, leads, title):
+    """
+    Sitting vs jogging of all detectors as in jf_stats_detectors.py and
+    sensitivity_stats_plots.py.
+    """
+    module = stats_module(kind)
+    m, l, u = module.cis([[scores(data, kind, det, leads, e) for det in det_names] for e in ('sitting', 'jogging')])
+    err = bootstrap.errorbars(m, l, u)
+    y_label = 'JF (%)' if kind == key_jf else 'Sensitivity (%)'
+    module.double_plot(m[0], err[0], m[1], err[1], y_label, 'Sitting', 'Jogging', title)
+
+
+def multi_plot_task(data, kind, leads):
+    """
+    All experiments of the selected detectors as in jf_stats_activities.py.
+    """
+    dets = jf_stats_activities.dets
+    m, l, u = jf_stats_activities.cis([[scores(data, kind, det, leads, e) for e in experiment_names] for det in dets])
+    jf_stats_activities.multi_plot(list(m), bootstrap.errorbars(m, l, u), 'JF (%)', dets, leads)
+
+
+def stats_table_task(data, kind):
+    """
+    t-tests of all detectors against the minimum as calc_stats() of
+    jf_stats_detectors.py and sensitivity_stats_plots.py.
+    returns the LaTeX tables.
+    """
+    module = stats_module(kind)
+    return "".join([printed(module.print_stats, [scores(data, kind, det, leads, e) for det in det_names], leads, e)
+                    for leads in (einth, cs) for e in ('sitting', 'jogging')])
+
+
+def activities_table_task(data, kind, leads):
+    """
+    t-tests of the selected detectors in all experiments as calc_stats() of
+    jf_stats_activities.py.
+    returns the LaTeX tables.
+    """
+    return "".join([printed(jf_stats_activities.print_stats, [scores(data, kind, det, leads, e) for e in experiment_names], det, leads)
+                    for det in jf_stats_activities.dets])
+
+
+def pairs_table_task(data, kind):
+    """
+    Paired comparison of all detectors as calc_pair_stats() of jf_stats_detectors.py.
+    returns the LaTeX tables.
+    """
+    jf = [[[subjects(data, kind, det, leads, e) for det in det_names] for e in experiment_names] for leads in (einth, cs)]
+    return printed(jf_stats_detectors.print_pair_stats, jf, [einth, cs], experiment_names)
+
+
+def tasks(aggregate, outdir):
+    """
+    All figures and tables as (output file, function, arguments, data).
+    """
+    t = []
+    for kind, name in ((key_jf, "jf_einth"), (key_sens, "sensitivity")):
+        t.append((os.path.join(outdir, name+".png"), double_plot_task, (kind, einth, 'Einthoven'),
+                  subset(aggregate, kind, det_names, [einth], ['sitting', 'jogging'])))
+    for kind, name in ((key_jf, "jf_chest"), (key_sens, "sensitivity_chest")):
+        t.append((os.path.join(outdir, name+".png"), double_plot_task, (kind, cs, 'Chest strap'),
+                  subset(aggregate, kind, det_names, [cs], ['sitting', 'jogging'])))
+    for leads, suffix in ((einth, ""), (cs, "_chest")):
+        data = subset(aggregate, key_jf, jf_stats_activities.dets, [leads], experiment_names)
+        t.append((os.path.join(outdir, "jf_activities"+suffix+".png"), multi_plot_task, (key_jf, leads), data))
+        t.append((os.path.join(outdir, "jf_activities_stats"+suffix+".tex"), activities_table_task, (key_jf, leads), data))
+    for kind, name in ((key_jf, "jf_stats"), (key_sens, "sensitivity_stats")):
+        t.append((os.path.join(outdir, name+".tex"), stats_table_task, (kind,),
+                  subset(aggregate, kind, det_names, [einth, cs], ['sitting', 'jogging'])))
+    t.append((os.path.join(outdir, "jf_pairs.tex"), pairs_table_task, (key_jf,),
+              subset(aggregate, key_jf, det_names, [einth, cs], experiment_names)))
+    return t
+
+
+def render(task):
+    """
+    Renders one figure or table. Runs in a worker of the pool.
+    """
+    fname, func, args, data = task
+    r = func(data, *args)
+    if fname.endswith(".png"):
+        plt.savefig(fname)
+        plt.close("all")
+    else:
+        with open(fname, "w") as f:
+            f.write(r)
+    return fname
+
+
+def report(outdir=".", processes=4, force=False):
+    """
+    Redraws all outputs whose data has changed since the last report.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    aggregate = build_aggregate()
+    manifest = {}
+    if os.path.exists(manifest_file) and not force:
+        with open(manifest_file, "r") as f:
+            manifest = json.loads(f.read())
+    todo = []
+    digests = {}
+    for task in tasks(aggregate, outdir):
+        fname = task[0]
+        digests[fname] = data_digest(task[3])
+        if manifest.get(fname) != digests[fname] or not os.path.exists(fname):
+            todo.append(task)
+    print("Rendering {} of {} outputs".format(len(todo), len(digests)))
+    if processes > 1:
+        with Pool(processes) as pool:
+            done = pool.map(render, todo)
+    else:
+        done = [render(task) for task in todo]
+    for fname in done:
+        print("Rendered", fname)
+        manifest[fname] = digests[fname]
+    results.write_json(manifest_file, manifest)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renders all figures and tables from the results.")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--outdir", default=".", help="directory of the figures and tables")
+    parser.add_argument("--force", action="store_true", help="redraw everything")
+    args = parser.parse_args()
+    report(args.outdir, args.processes, args.force)
@@ -0,0 +1,134 @@
+"""
+Results
+=======
+Keeps the per subject results of a sweep over detectors, leads,
+experiments and subjects in one contiguous NumPy structured array
+instead of lists of dicts and tuples.
+
+A ResultTable holds one record type (jf_analysis.JFResult or
+sensitivity_analysis.SensResult). Detector, lead and experiment names are
+stored as indices into name lists of the table. to_json() converts the
+results of a detector into the shape of the results files:
+{lead: {experiment: [result of every subject]}}.
+
+Units which failed (timeout, exception) are stored as the failed()
+record of the record type with an error message. In the results files
+the error is added as "error" to a JF dict and as the last element to a
+sensitivity tuple.
+"""
+import os
+import json
+import socket
+import numpy as np
+
+# fields of every row which identify the result
+index_fields = [("detector", "i2"), ("lead", "i2"), ("experiment", "i2"), ("subject", "i2")]
+
+
+class ResultTable:
+    """
+    Growable structured array of results.
+    record_type: JFResult or SensResult
+    capacity: initial number of rows
+    """
+
+    def __init__(self, record_type, capacity=256):
+        self.record_type = record_type
+        self.dtype = np.dtype(index_fields + record_type._fields)
+        self.data = np.zeros(capacity, dtype=self.dtype)
+        self.n = 0
+        self.detectors = []
+        self.leads = []
+        self.experiments = []
+        self.errors = {} # error messages of failed rows
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def array(self):
+        """
+        The results as a structured array.
+        """
+        return self.data[:self.n]
+
+    def name_index(self, names, name):
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def append(self, detector, lead, experiment, subject, result, error=None):
+        """
+        Adds the result of one subject.
+        error: message if the unit failed, result is then record_type.failed()
+        """
+        if self.n == len(self.data):
+            self.data = np.concatenate((self.data, np.zeros(len(self.data), dtype=self.dtype)))
+        self.data[self.n] = (self.name_index(self.detectors, detector),
+                             self.name_index(self.leads, lead),
+                             self.name_index(self.experiments, experiment),
+                             subject) + result.row()
+        if error is not None:
+            self.errors[self.n] = error
+        self.n = self.n + 1
+
+    def records(self, detector, lead, experiment):
+        """
+        The results of all subjects of a detector, lead and experiment as records.
+        """
+        a = self.array
+        if (detector not in self.detectors) or (lead not in self.leads) or (experiment not in self.experiments):
+            return []
+        rows = a[(a["detector"] == self.detectors.index(detector)) &
+                 (a["lead"] == self.leads.index(lead)) &
+                 (a["experiment"] == self.experiments.index(experiment))]
+        return [self.record_type.from_row(row) for row in rows]
+
+    def to_json(self, detector, leads=None, experiments=None):
+        """
+        The results of a detector in the shape of the results files.
+        leads, experiments: names which are always included, even without
+        results. By default all names with results.
+        """
+        a = self.array
+        if detector in self.detectors:
+            index = np.flatnonzero(a["detector"] == self.detectors.index(detector))
+        else:
+            index = np.arange(0)
+        a = a[index]
+        if leads is None:
+            leads = [l for i, l in enumerate(self.leads) if np.any(a["lead"] == i)]
+        if experiments is None:
+            experiments = [e for i, e in enumerate(self.experiments) if np.any(a["experiment"] == i)]
+        data = {}
+        for lead in leads:
+            data[lead] = {}
+            for experiment in experiments:
+                rows = np.flatnonzero((a["lead"] == self.name_index(self.leads, lead)) &
+                                      (a["experiment"] == self.name_index(self.experiments, experiment)))
+                data[lead][experiment] = [self.row_json(int(index[i])) for i in rows]
+        return data
+
+    def row_json(self, i):
+        """
+        The result of row i as stored in the results files.
+        """
+        r = self.record_type.from_row(self.data[i]).as_json()
+        if i not in self.errors:
+            return r
+        if isinstance(r, dict):
+            return dict(r, error=self.errors[i])
+        return tuple(r) + (self.errors[i],)
+
+
+def write_json(fname, data):
+    """
+    Saves data as a JSON file. It's written to a temporary file and renamed
+    so that other processes either see the old or the new file, never a
+    half written one. nan isn't valid JSON and raises a ValueError.
+    """
+    tmp = "{}.{}.{}.tmp".format(fname, socket.gethostname(), os.getpid())
+    data = json.dumps(data, indent="\t", allow_nan=False)
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, fname)
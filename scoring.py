@@ -0,0 +1,192 @@
+"""
+Matrix scoring
+==============
+Scores the detections of several detectors against the annotations of
+one recording. The annotation side (sorting, trim window and trimmed
+annotations) is prepared once with prepare() and then score() matches
+all detectors together in batched vector operations.
+
+The result is a detector by metric table with the columns in metric_keys.
+Every row is identical to what jf_analysis.evaluate and
+sensitivity_analysis.evaluate give for that detector.
+"""
+import numpy as np
+import util
+import jf_analysis
+
+# key of the sensitivity column (sensitivity_analysis.evaluate with a tolerance of tol)
+key_sensitivity = "sensitivity"
+
+# columns of the score table
+metric_keys = [jf_analysis.key_jitter, jf_analysis.key_f1, jf_analysis.key_jf,
+               jf_analysis.key_tp, jf_analysis.key_fp, jf_analysis.key_fn,
+               key_sensitivity]
+
+# keys for the prepared annotations dict:
+key_fs = "fs"
+key_trim = "trim"
+key_tol = "tol"
+key_anno = "anno" # sorted annotations
+key_anno_unique = "anno_unique" # sorted unique annotations for the sensitivity
+key_anno_trimmed = "anno_trimmed" # annotations after trimming
+key_start = "start" # first sample position of the detections kept by trimming
+key_end = "end" # last sample position of the detections kept by trimming
+
+
+def prepare(anno_R, fs, trim=True, tol=None):
+    """
+    Prepares the annotations of a recording for score().
+    anno_R: the ground truth in samples
+    fs: sampling rate of the ECG file
+    trim: trims the start/end as jf_analysis.evaluate does
+    tol: tolerance of the sensitivity in samples, fs/10 if not given
+    """
+    anno = np.sort(anno_R)
+    prepared = {}
+    prepared[key_fs] = fs
+    prepared[key_trim] = trim
+    prepared[key_tol] = fs / 10 if tol is None else tol
+    prepared[key_anno] = anno
+    prepared[key_anno_unique] = np.unique(anno)
+    prepared[key_anno_trimmed] = anno
+    prepared[key_start] = -np.inf
+    prepared[key_end] = np.inf
+    if trim:
+        a, b = jf_analysis.a, jf_analysis.b
+        prepared[key_anno_trimmed] = anno[a:(b+1)]
+        prepared[key_start] = int((anno[a]+anno[a-1])/2)
+        prepared[key_end] = int((anno[b]+anno[b+1])/2)
+    return prepared
+
+
+def group_median(values, groups, n):
+    """
+    Median of the values of each of the n groups. nan for empty groups.
+    """
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n)
+    starts = np.cumsum(counts) - counts
+    m = np.full(n, np.nan)
+    has = counts > 0
+    lo = values[starts[has] + (counts[has]-1)//2]
+    hi = values[starts[has] + counts[has]//2]
+    m[has] = (lo + hi) / 2
+    return m
+
+
+def concatenate(det_list):
+    """
+    Joins the detections of all detectors into one array, sorted by detector
+    and position.
+    returns the detections, the index of their detector and their index in
+    the detections of their detector.
+    """
+    det = [np.asarray(d) for d in det_list]
+    ids = np.repeat(np.arange(len(det)), [len(d) for d in det])
+    pos = np.concatenate([np.arange(len(d)) for d in det]) if len(det) > 0 else np.array([], dtype=np.int64)
+    det = np.concatenate(det) if len(det) > 0 else np.array([])
+    if not np.issubdtype(det.dtype, np.floating):
+        det = det.astype(np.int64)
+    order = np.lexsort((det, ids))
+    return det[order], ids[order], pos[order]
+
+
+def score(prepared, det_list):
+    """
+    Scores the detections of all detectors against the prepared annotations.
+    prepared: the annotations from prepare()
+    det_list: list of the detections (in samples) of every detector
+    returns a table with a row for every detector and the columns in metric_keys.
+    Undefined results are nan.
+    """
+    n = len(det_list)
+    fs = prepared[key_fs]
+    anno = prepared[key_anno]
+    anno_trimmed = prepared[key_anno_trimmed]
+    table = np.full((n, len(metric_keys)), np.nan)
+    det, ids, pos = concatenate(det_list)
+    if n == 0 or len(det) == 0:
+        return table
+
+    # Median delay of the detections against the annotations
+    index, r_peaks = util.nearest(anno, det)
+    delay_correction = np.floor(group_median(r_peaks, ids, n))
+    valid = ~np.isnan(delay_correction) # detectors with detections
+    delay = np.where(valid, delay_correction, 0).astype(det.dtype)
+
+    # Correction for detector delay and trimming
+    det_posn = det - delay[ids]
+    kept = (det_posn >= prepared[key_start]) & (det_posn <= prepared[key_end])
+    det_posn, det_ids, det_pos = det_posn[kept], ids[kept], pos[kept]
+    len_det_posn = np.bincount(det_ids, minlength=n)
+
+    # All detectors in one sorted array. Every detector is shifted into its
+    # own range which is twice as wide as all positions so that the nearest
+    # detection of an annotation never belongs to another detector if the
+    # detector has detections at all.
+    lo = min(det_posn.min(initial=0), anno.min(initial=0))
+    span = 2 * (max(det_posn.max(initial=0), anno.max(initial=0)) - lo + 1)
+    keys = det_ids * span + (det_posn - lo)
+    queries = (np.arange(n)[:, None] * span + (anno_trimmed - lo)[None, :]).ravel()
+    query_ids = np.repeat(np.arange(n), len(anno_trimmed))
+    matched = keys[:0]
+    diffs = keys[:0]
+    if len(keys) > 0:
+        # On a tie the detection which comes first in the list of its
+        # detector wins as in jf_analysis.nearest_diff.
+        keys, first = np.unique(keys, return_index=True)
+        index, diffs = util.nearest(keys, queries, det_pos[first])
+        own = det_ids[first][index] == query_ids
+        matched, diffs = keys[index[own]], diffs[own]
+
+    # Unique matches by always choosing the shortest time difference
+    order = np.lexsort((diffs, matched))
+    starts = np.flatnonzero(np.diff(matched[order], prepend=np.nan) != 0)
+    unique_diffs = diffs[order][starts]
+    unique_ids = (matched[order][starts] // span).astype(np.int64)
+
+    differences_for_jitter = np.abs(unique_diffs / fs)
+    jitter_median = group_median(differences_for_jitter, unique_ids, n)
+    jitter = group_median(np.abs(differences_for_jitter - jitter_median[unique_ids]), unique_ids, n)
+
+    tp = np.bincount(unique_ids, minlength=n)
+    fp = len_det_posn - tp
+    fn = len(anno_trimmed) - tp
+    total = 2*tp + fp + fn
+    f1 = np.where(total > 0, 2*tp / np.maximum(total, 1), np.nan)
+
+    table[:, metric_keys.index(jf_analysis.key_jitter)] = jitter
+    table[:, metric_keys.index(jf_analysis.key_f1)] = f1
+    table[:, metric_keys.index(jf_analysis.key_jf)] = jf_analysis.score(jitter, f1)
+    table[:, metric_keys.index(jf_analysis.key_tp)] = tp
+    table[:, metric_keys.index(jf_analysis.key_fp)] = fp
+    table[:, metric_keys.index(jf_analysis.key_fn)] = fn
+    table[:, metric_keys.index(key_sensitivity)] = sensitivity(prepared, det, ids, delay, n)
+    table[~valid] = np.nan
+    return table
+
+
+def sensitivity(prepared, det, ids, delay, n):
+    """
+    Sensitivity of every detector from the concatenated raw detections
+    and the median delay of every detector.
+    """
+    tol = prepared[key_tol]
+    anno = prepared[key_anno_unique]
+    # unique detections per detector
+    first = np.ones(len(det), dtype=bool)
+    first[1:] = (det[1:] != det[:-1]) | (ids[1:] != ids[:-1])
+    det, ids = det[first], ids[first]
+    pad = tol + np.abs(delay).max() + 1
+    lo = min(det.min(), anno.min(initial=0)) - pad
+    span = 2 * (max(det.max(), anno.max(initial=0)) + pad - lo + 1)
+    keys = ids * span + (det - lo)
+    centre = (np.arange(n)[:, None] * span + delay[:, None] + (anno - lo)[None, :])
+    # number of detections within the tolerance window of every annotation
+    hits = np.searchsorted(keys, centre + tol, side="right") - \
+        np.searchsorted(keys, centre - tol, side="left")
+    tp = np.count_nonzero(hits > 0, axis=1)
+    if len(anno) == 0:
+        return np.full(n, np.nan)
+    return tp / len(anno) * 100.0
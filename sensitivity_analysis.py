@@ -5,6 +5,69 @@ Trad sensitivity analysis with true positives, false positives, and false negati
 import numpy as np
 import util
 
+
+class SensResult:
+    """
+    Result of evaluate(). A compact record which unpacks and indexes like the
+    tuple (sensitivity, tp, fp, fn) it replaces.
+    """
+    __slots__ = ("sensitivity", "tp", "fp", "fn")
+
+    # NumPy dtypes of the fields for results.ResultTable
+    _fields = [("sensitivity", "f8"), ("tp", "i8"), ("fp", "i8"), ("fn", "i8")]
+
+    def __init__(self, sensitivity, tp, fp, fn):
+        self.sensitivity = sensitivity
+        self.tp = tp
+        self.fp = fp
+        self.fn = fn
+
+    def __getitem__(self, i):
+        return self.as_json()[i]
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __iter__(self):
+        return iter(self.as_json())
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(self.as_json())
+
+    def __repr__(self):
+        return repr(self.as_json())
+
+    def row(self):
+        """
+        Field values for a table row. False is stored as nan.
+        """
+        return tuple(np.nan if v is False else v for v in self.as_json())
+
+    @classmethod
+    def from_row(cls, row):
+        tp, fp, fn = int(row["tp"]), int(row["fp"]), int(row["fn"])
+        sensitivity = float(row["sensitivity"])
+        if (tp + fn) == 0:
+            sensitivity = False
+        return cls(sensitivity, tp, fp, fn)
+
+    @classmethod
+    def failed(cls):
+        """
+        Result of a unit which couldn't be evaluated, like one without beats.
+        """
+        return cls(False, 0, 0, 0)
+
+    def as_json(self):
+        """
+        The tuple as stored in the results files.
+        """
+        return (self.sensitivity, self.tp, self.fp, self.fn)
+
+
 """
 The central function evaluating true positive, false positive and false negative.
 """
@@ -15,13 +78,10 @@ def evaluate(detected_peaks, annotation, tol):
     detected_peaks = np.unique(detected_peaks)
     annotation = np.unique(annotation)
     
-    tp = 0
-
-    for anno_value in annotation:
-        test_range = np.arange(anno_value-tol+delay, anno_value+1+tol+delay)
-        in1d = np.in1d(test_range, detected_peaks)
-        if np.any(in1d):
-            tp = tp + 1
+    # annotations with a detection within the tolerance window
+    first = np.searchsorted(detected_peaks, annotation-tol+delay, side="left")
+    last = np.searchsorted(detected_peaks, annotation+tol+delay, side="right")
+    tp = int(np.count_nonzero(last > first))
 
     fp = len(detected_peaks)-tp
     fn = len(annotation)-tp
@@ -31,4 +91,4 @@ def evaluate(detected_peaks, annotation, tol):
     if (tp + fn) > 0:
         sensitivity = tp/(tp+fn)*100.0
 
-    return (sensitivity, tp, fp, fn)
+    return SensResult(sensitivity, tp, fp, fn)
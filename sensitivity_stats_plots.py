@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import scipy.stats as stats
 from ecgdetectors import Detectors
 import json
+import bootstrap
 
 experiment_names = ['sitting','maths','walking','hand_bike','jogging']
 
@@ -24,7 +25,7 @@ def get_sensitivities(detector_name, leads, experiment):
     f = open(resultsdir+"/sens_"+detector_name+".json","r")
     js = f.read()
     data = json.loads(js)
-    s = [i[0] for i in data[leads][experiment]]
+    s = [i[0] for i in data[leads][experiment] if i[0] is not False] # failed units are False
     return np.array(s)
 
 
@@ -39,6 +40,26 @@ def get_result(det, leads, experiment):
 
     return np.array(m),np.array(s)
 
+def get_cis(cells):
+    """
+    Bootstrap CIs of the mean of all detectors for all (leads, experiment)
+    cells at once.
+    returns the mean, lower and upper bound as cells x detectors arrays.
+    """
+    return cis([[get_sensitivities(det, leads, experiment) for det in det_names] for leads, experiment in cells])
+
+
+def cis(scores):
+    """
+    Bootstrap CIs of the mean of the scores of every detector in every cell.
+    scores: for every cell a list with the scores of every detector
+    returns the mean, lower and upper bound as cells x detectors arrays.
+    """
+    m, l, u = bootstrap.bootstrap([s for cell in scores for s in cell])
+    shape = (len(scores), len(det_names))
+    return m.reshape(shape), l.reshape(shape), u.reshape(shape)
+
+
 def print_stat(p):
     if p == None:
         print('--- & ',end='')
@@ -50,13 +71,19 @@ def print_stat(p):
 
     
 def calc_stats(leads, experiment):
+    print_stats([get_sensitivities(det1, leads, experiment) for det1 in det_names], leads, experiment)
+
+
+def print_stats(scores, leads, experiment):
+    """
+    One sample t-tests of the sensitivities of every detector against min_sens as LaTeX.
+    """
     print("Stats:",leads, experiment)
     print("      & ",end='')
     for det1 in det_names:
         print(det1," & ",end='')
     print("\\\\")
-    for det1 in det_names:
-        r1 = get_sensitivities(det1, leads, experiment)
+    for r1 in scores:
         t,p = stats.ttest_1samp(r1,min_sens,alternative='greater')
         print_stat(p)
     print()
@@ -86,45 +113,63 @@ def double_plot(data1, std1, data2, std2, y_label, legend1, legend2, title=None)
 
     return rects1, rects2
 
+def print_ci(title,lower,upper,legend):
+    print("Sensitivities {}% CI:".format(bootstrap.confidence),title)
+    for i in zip(legend,lower,upper):
+        print("{}: [{:1.1f}, {:1.1f}]".format(i[0],i[1],i[2]))
+    print()
+
+
 def print_result(title,data,std,legend):
     print("Sensitivities:",title)
     for i in zip(legend,data,std):
         print("{}: {:1.1f}+/-{:1.1f}".format(i[0],i[1],i[2]))
     print()
 
-cs_sitting_avg,cs_sitting_std = get_result(det_names, cs, 'sitting')
-einthoven_sitting_avg,einthoven_sitting_std = get_result(det_names, einth, 'sitting')
+if __name__ == "__main__":
+    cs_sitting_avg,cs_sitting_std = get_result(det_names, cs, 'sitting')
+    einthoven_sitting_avg,einthoven_sitting_std = get_result(det_names, einth, 'sitting')
 
-cs_jogging_avg,cs_jogging_std = get_result(det_names, cs, 'jogging')
-einthoven_jogging_avg,einthoven_jogging_std = get_result(det_names, einth, 'jogging')
+    cs_jogging_avg,cs_jogging_std = get_result(det_names, cs, 'jogging')
+    einthoven_jogging_avg,einthoven_jogging_std = get_result(det_names, einth, 'jogging')
+
+    print()
 
-print()
+    print_result('sitting Einthoven',einthoven_sitting_avg,einthoven_sitting_std,det_names)
+    print_result('jogging Einthoven',einthoven_jogging_avg,einthoven_jogging_std,det_names)
 
-print_result('sitting Einthoven',einthoven_sitting_avg,einthoven_sitting_std,det_names)
-print_result('jogging Einthoven',einthoven_jogging_avg,einthoven_jogging_std,det_names)
+    print_result('sitting chest strap',cs_sitting_avg,cs_sitting_std,det_names)
+    print_result('jogging chest strap',cs_jogging_avg,cs_jogging_std,det_names)
 
-print_result('sitting chest strap',cs_sitting_avg,cs_sitting_std,det_names)
-print_result('jogging chest strap',cs_jogging_avg,cs_jogging_std,det_names)
+    ci_cells = [(einth,'sitting'), (einth,'jogging'), (cs,'sitting'), (cs,'jogging')]
+    ci_mean, ci_lower, ci_upper = get_cis(ci_cells)
+    ci_err = bootstrap.errorbars(ci_mean, ci_lower, ci_upper)
 
-double_plot(einthoven_sitting_avg, einthoven_sitting_std,
-            einthoven_jogging_avg,einthoven_jogging_std,
-            'Sensitivity (%)', 'Sitting', 'Jogging', 'Einthoven')
+    print_ci('sitting Einthoven',ci_lower[0],ci_upper[0],det_names)
+    print_ci('jogging Einthoven',ci_lower[1],ci_upper[1],det_names)
 
+    print_ci('sitting chest strap',ci_lower[2],ci_upper[2],det_names)
+    print_ci('jogging chest strap',ci_lower[3],ci_upper[3],det_names)
 
-double_plot(cs_sitting_avg, cs_sitting_std,
-            cs_jogging_avg, cs_jogging_std,
-            'Sensitivity (%)', 'Sitting', 'Jogging', 'Chest strap')
+    double_plot(einthoven_sitting_avg, ci_err[0],
+                einthoven_jogging_avg, ci_err[1],
+                'Sensitivity (%)', 'Sitting', 'Jogging', 'Einthoven')
 
 
-calc_stats(einth,"sitting")
-calc_stats(einth,"jogging")
+    double_plot(cs_sitting_avg, ci_err[2],
+                cs_jogging_avg, ci_err[3],
+                'Sensitivity (%)', 'Sitting', 'Jogging', 'Chest strap')
 
-print()
 
-calc_stats(cs,"sitting")
-calc_stats(cs,"jogging")
+    calc_stats(einth,"sitting")
+    calc_stats(einth,"jogging")
+
+    print()
+
+    calc_stats(cs,"sitting")
+    calc_stats(cs,"jogging")
 
 
 
 
-plt.show()
+    plt.show()
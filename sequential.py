@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+"""
+Sequential evaluation
+=====================
+Adaptive version of jf_evaluate_all_detectors.py which stops evaluating
+a (detector, lead, experiment) cell as soon as its verdict against the
+JF threshold is settled.
+
+Subjects are run in order. From min_subjects on, a one sided t-test
+against minjf (as in the stats scripts) is done after every subject in
+both directions. The cell stops with "pass" if the mean JF is
+significantly above minjf and with "fail" if it's significantly below.
+If all scores are equal there's no variance for the t-test and a sign
+test against minjf is used instead. Every look uses alpha divided by
+the number of possible looks (Bonferroni) and each of the two directions
+half of it so the overall error rate stays below alpha. Cells which are
+never settled are "undecided".
+
+The results of an early stopped cell only have the evaluated subjects
+and aren't a complete sample for the stats scripts. They are saved
+separately as results/sequential_jf_<detector>.json and the verdicts
+and skipped units in results/sequential_<detector>.json.
+
+python sequential.py        # all detectors in parallel
+python sequential.py 3      # detector with index 3 (or its name) of registry.py
+"""
+import sys
+import numpy as np
+from scipy import stats
+from multiprocessing import Process
+
+import jf_analysis
+import results
+import registry
+import jf_evaluate_all_detectors as runner
+
+alpha = 0.05
+
+minjf = 90 # %
+
+# number of subjects before the first test
+min_subjects = 5
+
+n_subjects = 25
+
+key_verdict = "verdict"
+key_evaluated = "evaluated" # units which have been run
+key_skipped = "skipped" # units which have been skipped
+
+
+def verdict(scores, alpha):
+    """
+    One sided t-tests of the JF scores in % against minjf. alpha is split
+    between the two directions.
+    returns "pass", "fail" or None if neither is significant.
+    """
+    if len(scores) < 2:
+        return None
+    if np.ptp(scores) == 0: # no variance, for example 100% for every subject
+        # sign test as the t-test isn't defined
+        n = len(scores) if scores[0] != minjf else 0
+        if n == 0:
+            return None
+        p = stats.binomtest(n, n, 0.5, alternative='greater').pvalue
+        if p < alpha / 2:
+            return "pass" if scores[0] > minjf else "fail"
+        return None
+    if stats.ttest_1samp(scores, minjf, alternative='greater').pvalue < alpha / 2:
+        return "pass"
+    if stats.ttest_1samp(scores, minjf, alternative='less').pvalue < alpha / 2:
+        return "fail"
+    return None
+
+
+def evaluate_cell(detector, record_lead, experiment, table):
+    """
+    Runs the subjects of a cell until the verdict is settled.
+    The results are added to table.
+    returns a dict with the verdict and the number of evaluated and skipped units.
+    """
+    alpha_look = alpha / (n_subjects - min_subjects + 1)
+    scores = []
+    decision = None
+    evaluated = 0
+    for subject_number in range(0, n_subjects):
+        jf_result, error = runner.run_unit(detector, record_lead, experiment, subject_number)
+        evaluated = evaluated + 1
+        if jf_result is None:
+            continue
+        table.append(detector[1].__name__, record_lead, experiment, subject_number, jf_result, error)
+        if jf_result[jf_analysis.key_jf]:
+            scores.append(jf_result[jf_analysis.key_jf]*100)
+        if len(scores) >= min_subjects:
+            decision = verdict(scores, alpha_look)
+            if decision is not None:
+                break
+    if decision is None:
+        decision = "undecided"
+    cell = {}
+    cell[key_verdict] = decision
+    cell[key_evaluated] = evaluated
+    cell[key_skipped] = n_subjects - evaluated
+    return cell
+
+
+def evaluate_detector(detector):
+
+    detectorname = detector[1].__name__
+
+    print("Processing:",detector[0])
+
+    table = results.ResultTable(jf_analysis.JFResult)
+    report = {}
+
+    for record_lead in runner.all_recording_leads:
+        report[record_lead] = {}
+        for experiment in runner.all_experiments:
+            report[record_lead][experiment] = evaluate_cell(detector, record_lead, experiment, table)
+
+    results.write_json(runner.resultsdir+"/sequential_jf_"+detectorname+".json",
+                       table.to_json(detectorname, runner.all_recording_leads, runner.all_experiments))
+    results.write_json(runner.resultsdir+"/sequential_"+detectorname+".json", report)
+
+    print_report(detectorname, report)
+
+
+def print_report(detectorname, report):
+    skipped = 0
+    total = 0
+    print("Sequential evaluation of", detectorname)
+    for record_lead, experiments in report.items():
+        for experiment, cell in experiments.items():
+            print("{} {}: {} after {} subjects, {} skipped".format(
+                record_lead, experiment, cell[key_verdict], cell[key_evaluated], cell[key_skipped]))
+            skipped = skipped + cell[key_skipped]
+            total = total + cell[key_evaluated] + cell[key_skipped]
+    print("Skipped {} of {} units ({:1.0f}%)".format(skipped, total, 100 * skipped / max(total, 1)))
+    print()
+
+
+if __name__ == "__main__":
+    if (len(sys.argv)>1):
+        evaluate_detector(registry.get(sys.argv[1]))
+    else:
+        for detector in registry.detector_list():
+            pEvalDet = Process(target=evaluate_detector, args=(detector,))
+            pEvalDet.start()
@@ -0,0 +1,185 @@
+"""
+Synthetic recordings
+====================
+Generates annotated ECG-like recordings of any length together with the
+output of a simulated detector. Jitter, missed beats, extra beats and a
+systematic detector delay are set by parameters and everything is drawn
+from a seed so the same recording can be regenerated anywhere.
+
+Because the simulated detector is known exactly the JF and sensitivity
+results can be calculated directly from the construction. This makes the
+generator a correctness oracle for jf_analysis and sensitivity_analysis
+at Holter scale (24h at 70 bpm is about 100k beats).
+"""
+import numpy as np
+from scipy import stats
+import jf_analysis
+
+# keys for the recording dict:
+key_fs = "fs" # sampling rate
+key_anno = "anno" # annotated R peaks in samples
+key_det = "det" # simulated detections in samples
+key_ecg = "ecg" # ECG-like signal or None
+key_nsamples = "nSamples" # number of samples of the recording
+key_detected = "detected" # True for every annotation which has a detection
+key_offsets = "offsets" # detection - annotation of every detected beat in samples
+key_extra = "extra" # positions of the extra/spurious detections
+
+# RR intervals are clipped to this fraction of the mean RR interval so that
+# a missed beat is always closer to a neighbouring detection than to an
+# extra detection.
+max_hrv = 0.2
+
+
+def qrs_kernel(fs):
+    """
+    Simple PQRST shape sampled at fs. The R peak is in the centre.
+    """
+    t = np.arange(-int(0.3*fs), int(0.5*fs)+1) / fs
+    def wave(a, mu, sigma):
+        return a * np.exp(-0.5 * ((t - mu) / sigma)**2)
+    return (wave(0.15, -0.16, 0.025) +  # P
+            wave(-0.15, -0.02, 0.008) + # Q
+            wave(1.0, 0, 0.010) +       # R
+            wave(-0.25, 0.025, 0.008) + # S
+            wave(0.3, 0.25, 0.040))     # T
+
+
+def generate(n_beats, fs=250, heart_rate=70, hrv=0.05, jitter=2E-3,
+             missed=0, extra=0, delay=0, signal=True, seed=0):
+    """
+    Generates an annotated recording and the detections of a simulated detector.
+    n_beats: number of annotated beats
+    fs: sampling rate
+    heart_rate: average heart rate in beats per minute
+    hrv: standard deviation of the RR intervals relative to the mean RR interval
+    jitter: standard deviation of the detection jitter in s
+    missed: probability that a beat is not detected
+    extra: probability of an extra detection between two beats
+    delay: systematic delay of the detector in s, >= 0 as detectors can't
+           detect a beat before it happens (calcMedianDelay also only
+           finds the absolute delay)
+    signal: if False no ECG signal is generated (saves memory for benchmarks)
+    seed: seed of the random generator
+    returns a dict with the keys defined above.
+    """
+    rng = np.random.default_rng(seed)
+
+    rr_mean = 60 / heart_rate * fs
+    rr = rr_mean * (1 + hrv * rng.standard_normal(n_beats))
+    rr = np.clip(rr, (1 - max_hrv) * rr_mean, (1 + max_hrv) * rr_mean)
+    anno = np.round(np.cumsum(rr)).astype(np.int64)
+    nSamples = int(anno[-1] + rr_mean)
+
+    # Jitter is limited to 3 sigma so that a detection is always nearest
+    # to its own annotation.
+    max_jitter = 3 * jitter * fs
+    if delay < 0:
+        raise ValueError("The delay can't be negative.")
+    if delay * fs + max_jitter >= (1 - max_hrv) * rr_mean / 4:
+        raise ValueError("Delay and jitter must be well below a quarter of the RR interval.")
+    j = np.clip(jitter * fs * rng.standard_normal(n_beats), -max_jitter, max_jitter)
+    offsets_all = np.round(delay * fs + j).astype(np.int64)
+
+    detected = rng.random(n_beats) >= missed
+
+    # Extra detections sit in the middle of an RR interval. Intervals next to a
+    # missed beat or its neighbours are excluded so that the nearest detection
+    # of a missed beat is never an extra one.
+    near_missed = ~detected
+    near_missed[1:] |= ~detected[:-1]
+    near_missed[:-1] |= ~detected[1:]
+    has_extra = (rng.random(n_beats - 1) < extra) & ~near_missed[:-1] & ~near_missed[1:]
+    extra_posn = ((anno[:-1] + anno[1:]) // 2 + int(round(delay * fs)))[has_extra]
+
+    det = np.sort(np.concatenate((anno[detected] + offsets_all[detected], extra_posn)))
+
+    ecg = None
+    if signal:
+        impulses = np.zeros(nSamples)
+        impulses[anno] = 1
+        ecg = np.convolve(impulses, qrs_kernel(fs), mode="same")
+        ecg += 0.1 * np.sin(2 * np.pi * 0.3 * np.arange(nSamples) / fs) # baseline wander
+        ecg += 0.02 * rng.standard_normal(nSamples)
+
+    rec = {}
+    rec[key_fs] = fs
+    rec[key_anno] = anno
+    rec[key_det] = det
+    rec[key_ecg] = ecg
+    rec[key_nsamples] = nSamples
+    rec[key_detected] = detected
+    rec[key_offsets] = offsets_all[detected]
+    rec[key_extra] = extra_posn
+    return rec
+
+
+def expected_delay(rec):
+    """
+    The median delay util.calcMedianDelay finds for the simulated detector.
+    """
+    anno = rec[key_anno]
+    extra = rec[key_extra]
+    k = np.searchsorted(anno, extra) # extra detections sit between anno[k-1] and anno[k]
+    extra_dist = np.minimum(extra - anno[k-1], anno[k] - extra)
+    return int(np.median(np.concatenate((np.abs(rec[key_offsets]), extra_dist))))
+
+
+def expected_jf(rec, trim=True):
+    """
+    The result jf_analysis.evaluate gives for the simulated detector,
+    calculated from the construction of the recording.
+    """
+    anno = rec[key_anno]
+    detected = rec[key_detected]
+    fs = rec[key_fs]
+
+    m = expected_delay(rec)
+    offsets = rec[key_offsets] - m
+    det_true = anno[detected] + offsets
+    det_extra = rec[key_extra] - m
+
+    kept = np.ones(len(anno), dtype=bool)
+    n_det = len(det_true) + len(det_extra)
+    if trim:
+        a, b = jf_analysis.a, jf_analysis.b
+        start = int((anno[a] + anno[a-1]) / 2)
+        end = int((anno[b] + anno[b+1]) / 2)
+        kept[:] = False
+        kept[a:len(anno)+b+1] = True
+        n_det = np.count_nonzero((det_true >= start) & (det_true <= end)) + \
+            np.count_nonzero((det_extra >= start) & (det_extra <= end))
+
+    tp_mask = kept[detected]
+    tp = int(np.count_nonzero(tp_mask))
+    fn = int(np.count_nonzero(kept)) - tp
+    fp = int(n_det) - tp
+
+    jf = {}
+    jf[jf_analysis.key_jitter] = stats.median_abs_deviation(np.abs(offsets[tp_mask] / fs))
+    jf[jf_analysis.key_tp] = tp
+    jf[jf_analysis.key_fp] = fp
+    jf[jf_analysis.key_fn] = fn
+    if (tp + fp + fn) > 0:
+        f1 = (2*tp)/(2*tp + fp + fn)
+        jf[jf_analysis.key_f1] = f1
+        jf[jf_analysis.key_jf] = jf_analysis.score(jf[jf_analysis.key_jitter], f1)
+    else:
+        jf[jf_analysis.key_f1] = False
+        jf[jf_analysis.key_jf] = False
+    return jf
+
+
+def expected_sensitivity(rec, tol):
+    """
+    The result sensitivity_analysis.evaluate gives for the simulated detector
+    with an integer valued tolerance tol in samples.
+    """
+    m = expected_delay(rec)
+    tp = int(np.count_nonzero(np.abs(rec[key_offsets] - m) <= tol))
+    fp = len(np.unique(rec[key_det])) - tp
+    fn = len(rec[key_anno]) - tp
+    sensitivity = False
+    if (tp + fn) > 0:
+        sensitivity = tp/(tp+fn)*100.0
+    return (sensitivity, tp, fp, fn)
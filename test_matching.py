@@ -0,0 +1,125 @@
+"""
+Regression tests of the matching engines
+========================================
+jf_analysis.nearest_diff, util.calcMedianDelay and
+sensitivity_analysis.evaluate are checked against the loop versions they
+replaced on random unsorted detections with ties and duplicates.
+scoring.score is checked row by row against jf_analysis.evaluate and
+sensitivity_analysis.evaluate, and all of them against the synthetic
+recordings of synthetic.py with their known results.
+
+python -m pytest -q test_matching.py
+"""
+import numpy as np
+import pytest
+
+import util
+import jf_analysis
+import sensitivity_analysis
+import scoring
+import synthetic
+
+seeds = range(5)
+
+
+def reference_nearest_diff(annotation, nearest_match):
+    # loop version of jf_analysis.nearest_diff
+    used_indices = []
+    for a in annotation:
+        index = np.abs(nearest_match - a).argmin()
+        used_indices.append((index, np.abs(nearest_match[index] - a)))
+    unique_diffs = []
+    index_used = []
+    for j in used_indices:
+        if not (j[0] in index_used):
+            uni = [k for k in used_indices if k[0] == j[0]]
+            unique_diffs.append(uni[np.argmin(uni, 0)[1]][1])
+            index_used.append(j[0])
+    return unique_diffs
+
+
+def reference_median_delay(detected_peaks, anno):
+    # loop version of util.calcMedianDelay
+    return int(np.median([np.min(np.abs(i - anno)) for i in detected_peaks]))
+
+
+def reference_sensitivity(detected_peaks, annotation, tol):
+    # loop version of sensitivity_analysis.evaluate
+    delay = reference_median_delay(detected_peaks, annotation)
+    detected_peaks = np.unique(detected_peaks)
+    annotation = np.unique(annotation)
+    tp = 0
+    for a in annotation:
+        if np.any(np.isin(np.arange(a-tol+delay, a+1+tol+delay), detected_peaks)):
+            tp = tp + 1
+    fp = len(detected_peaks) - tp
+    fn = len(annotation) - tp
+    return (tp/(tp+fn)*100.0, tp, fp, fn)
+
+
+def random_case(seed):
+    """
+    Annotations and unsorted detections on a coarse grid so that there are
+    duplicate detections and ties between two detections.
+    """
+    rng = np.random.default_rng(seed)
+    anno = np.unique(rng.integers(0, 200, 60)) * 10
+    det = rng.integers(0, 400, 80) * 5
+    return anno, det
+
+
+@pytest.mark.parametrize("seed", seeds)
+def test_nearest_diff(seed):
+    anno, det = random_case(seed)
+    assert list(jf_analysis.nearest_diff(anno, det)) == reference_nearest_diff(anno, det)
+
+
+@pytest.mark.parametrize("seed", seeds)
+def test_median_delay(seed):
+    anno, det = random_case(seed)
+    assert util.calcMedianDelay(det, anno) == reference_median_delay(det, anno)
+
+
+@pytest.mark.parametrize("seed", seeds)
+def test_sensitivity(seed):
+    anno, det = random_case(seed)
+    assert tuple(sensitivity_analysis.evaluate(det, anno, 7)) == reference_sensitivity(det, anno, 7)
+
+
+def assert_row(row, jf, sensitivity):
+    for k in (jf_analysis.key_jitter, jf_analysis.key_f1, jf_analysis.key_jf,
+              jf_analysis.key_tp, jf_analysis.key_fp, jf_analysis.key_fn):
+        assert row[scoring.metric_keys.index(k)] == pytest.approx(jf[k], rel=1E-12, abs=1E-15)
+    assert row[scoring.metric_keys.index(scoring.key_sensitivity)] == pytest.approx(sensitivity[0], rel=1E-12)
+
+
+@pytest.mark.parametrize("seed", seeds)
+def test_score_random(seed):
+    anno, det = random_case(seed)
+    rng = np.random.default_rng(seed)
+    det_list = [det, rng.permutation(det), det[:40], np.sort(det)]
+    fs = 250
+    table = scoring.score(scoring.prepare(anno, fs), det_list)
+    for row, d in zip(table, det_list):
+        assert_row(row, jf_analysis.evaluate(d, anno, fs, anno[-1]), sensitivity_analysis.evaluate(d, anno, fs / 10))
+
+
+@pytest.mark.parametrize("seed", seeds)
+def test_synthetic_oracle(seed):
+    settings = [dict(jitter=1E-3), dict(jitter=4E-3, missed=0.05, extra=0.05, delay=0.03),
+                dict(jitter=2E-3, missed=0.2, extra=0.1, delay=0.01)]
+    recs = [synthetic.generate(300, signal=False, seed=seed*len(settings)+i, **s)
+            for i, s in enumerate(settings)]
+    for rec in recs:
+        fs = rec[synthetic.key_fs]
+        det, anno = rec[synthetic.key_det], rec[synthetic.key_anno]
+        jf = jf_analysis.evaluate(det, anno, fs, rec[synthetic.key_nsamples])
+        expected = synthetic.expected_jf(rec)
+        for k in (jf_analysis.key_tp, jf_analysis.key_fp, jf_analysis.key_fn):
+            assert jf[k] == expected[k]
+        for k in (jf_analysis.key_jitter, jf_analysis.key_f1, jf_analysis.key_jf):
+            assert jf[k] == pytest.approx(expected[k], rel=1E-12, abs=1E-15)
+        sensitivity = sensitivity_analysis.evaluate(det, anno, fs / 10)
+        assert tuple(sensitivity) == synthetic.expected_sensitivity(rec, fs / 10)
+        table = scoring.score(scoring.prepare(anno, fs), [det])
+        assert_row(table[0], expected, sensitivity)
@@ -8,17 +8,33 @@ introduce.
 """
 def calcMedianDelay(detected_peaks, anno):
 
-    r_peaks = []
-
-    for i in detected_peaks:
-        d = np.abs(i-anno)
-        ii = np.argmin(d)
-        r_peaks.append(d[ii])
+    anno = np.sort(anno)
+    index, r_peaks = nearest(anno, np.asarray(detected_peaks))
 
     m = int(np.median(r_peaks))
     return m
 
 
+def nearest(sorted_values, x, priority=None):
+    """
+    Finds the nearest of the sorted values for every element of x.
+    On a tie the lower value wins as np.argmin would pick it.
+    priority: optional rank of every value, on a tie the value with the
+    lower rank wins instead. With the index of the first occurrence of every
+    value in unsorted data the result is the same as np.argmin on that data.
+    returns the indices of the nearest values and the absolute differences.
+    """
+    right = np.clip(np.searchsorted(sorted_values, x, side="left"), 0, len(sorted_values)-1)
+    left = np.clip(right-1, 0, len(sorted_values)-1)
+    d_left = np.abs(x - sorted_values[left])
+    d_right = np.abs(sorted_values[right] - x)
+    if priority is None:
+        use_left = d_left <= d_right
+    else:
+        use_left = (d_left < d_right) | ((d_left == d_right) & (priority[left] <= priority[right]))
+    return np.where(use_left, left, right), np.where(use_left, d_left, d_right)
+
+
 def trim_after_detection(detections, annotations, start_index, end_index):
 
     # start_index = annotated index to start at after trimming
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+"""
+Work queue
+==========
+Spreads the JF evaluation over several processes and machines which
+share a directory. Every (detector, lead, experiment, subject) is a unit
+of work stored as a file in the queue directory:
+
+ todo/<unit>.json            waiting to be claimed
+ leases/<unit>.json.<worker> claimed by a worker
+ done/<unit>.json            result of the unit
+
+A worker claims a unit by renaming it from todo into leases which is
+atomic so only one worker can win. While it works on the unit it touches
+the lease regularly. Leases which haven't been touched for longer than
+the lease time belong to a dead worker and are moved back to todo by
+any other worker. Every unit runs under the time and memory budget of
+guard.py, units which fail are saved with their error. Results are
+written to a temporary file and renamed into done. The merge step
+combines all results into the usual results/jf_<detector>.json files.
+
+python workqueue.py init QUEUEDIR [--detectors two_average_detector ...] [--plugins my_detectors]
+python workqueue.py work QUEUEDIR [--processes 4]   # on every machine
+python workqueue.py status QUEUEDIR
+python workqueue.py merge QUEUEDIR
+"""
+import os
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+from multiprocessing import Process
+
+import jf_analysis
+import results
+import guard
+
+todo_dir = "todo"
+leases_dir = "leases"
+done_dir = "done"
+config_file = "config.json"
+
+# A lease which hasn't been touched for this long is claimed again (s)
+lease_time = 600
+
+# Time between two checks of the queue while only leased units are left (s)
+poll_interval = 10
+
+
+def unit_name(detectorname, record_lead, experiment, subject_number):
+    return "{}-{}-{}-{:02d}".format(detectorname, record_lead, experiment, subject_number)
+
+
+def read_json(fname):
+    with open(fname, "r") as f:
+        return json.loads(f.read())
+
+
+def worker_id():
+    return "{}.{}".format(socket.gethostname(), os.getpid())
+
+
+def init(queuedir, detectornames, leads, experiments, subjects, plugins=[]):
+    """
+    Puts all units which are not done yet into the queue.
+    plugins: modules which register detectors, imported by every worker
+    """
+    for d in (todo_dir, leases_dir, done_dir):
+        os.makedirs(os.path.join(queuedir, d), exist_ok=True)
+    config = {"detectors": detectornames, "leads": leads, "experiments": experiments, "plugins": plugins}
+    results.write_json(os.path.join(queuedir, config_file), config)
+    n = 0
+    for detectorname in detectornames:
+        for record_lead in leads:
+            for experiment in experiments:
+                for subject_number in subjects:
+                    unit = {"detector": detectorname, "lead": record_lead,
+                            "experiment": experiment, "subject": subject_number}
+                    name = unit_name(detectorname, record_lead, experiment, subject_number) + ".json"
+                    if os.path.exists(os.path.join(queuedir, done_dir, name)):
+                        continue
+                    results.write_json(os.path.join(queuedir, todo_dir, name), unit)
+                    n = n + 1
+    print("Queued {} units in {}".format(n, queuedir))
+
+
+def reclaim_expired(queuedir, lease_time=lease_time):
+    """
+    Moves leases which haven't been touched for lease_time back to todo.
+    """
+    now = time.time()
+    for lease in os.listdir(os.path.join(queuedir, leases_dir)):
+        fname = os.path.join(queuedir, leases_dir, lease)
+        try:
+            if now - os.path.getmtime(fname) > lease_time:
+                name = lease[:lease.index(".json.")] + ".json"
+                os.rename(fname, os.path.join(queuedir, todo_dir, name))
+                print("Reclaimed expired lease", lease)
+        except (FileNotFoundError, ValueError):
+            pass # finished or reclaimed by another worker
+
+
+def claim(queuedir):
+    """
+    Claims a unit from todo.
+    returns the file name of the lease or None if todo is empty.
+    """
+    names = os.listdir(os.path.join(queuedir, todo_dir))
+    random.shuffle(names) # less contention between workers
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        lease = os.path.join(queuedir, leases_dir, "{}.{}".format(name, worker_id()))
+        todo = os.path.join(queuedir, todo_dir, name)
+        try:
+            # The lease starts now. The file is touched before the rename
+            # because the rename keeps the old time of the todo file and the
+            # lease would look expired to other workers until it's touched.
+            os.utime(todo)
+            os.rename(todo, lease)
+        except FileNotFoundError:
+            continue # another worker was faster
+        if os.path.exists(os.path.join(queuedir, done_dir, name)):
+            os.remove(lease) # finished by a worker whose lease had expired
+            continue
+        return lease
+    return None
+
+
+def heartbeat(lease, stop, interval):
+    """
+    Touches the lease every interval s until stop is set.
+    """
+    while not stop.wait(interval):
+        try:
+            os.utime(lease)
+        except FileNotFoundError:
+            return # the lease has been reclaimed
+
+
+def process(queuedir, lease, lease_time=lease_time):
+    """
+    Evaluates the unit of a lease and saves the result in done.
+    """
+    import jf_evaluate_all_detectors as runner
+    try:
+        unit = read_json(lease)
+    except FileNotFoundError:
+        return # the lease has been reclaimed
+    name = os.path.basename(lease)
+    name = name[:name.index(".json.")] + ".json"
+    stop = threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(lease, stop, lease_time / 4), daemon=True)
+    beat.start()
+    try:
+        try:
+            detector = runner.find_detector(unit["detector"])
+            jf_result, error = runner.run_unit(detector, unit["lead"], unit["experiment"], unit["subject"])
+        except Exception as e:
+            # for example a plugin detector which isn't registered on this machine
+            print("Failed unit {}: {}".format(name, e))
+            jf_result, error = jf_analysis.JFResult.failed(), "{}: {}".format(type(e).__name__, e)
+        unit["result"] = None if jf_result is None else jf_result.as_json()
+        unit["error"] = error
+        results.write_json(os.path.join(queuedir, done_dir, name), unit)
+    finally:
+        stop.set()
+    try:
+        os.remove(lease)
+    except FileNotFoundError:
+        pass
+
+
+def work(queuedir, lease_time=lease_time, time_budget=guard.time_budget, memory_budget=guard.memory_budget):
+    """
+    Processes units until all units are done.
+    time_budget, memory_budget: budget of every unit, see guard.py
+    """
+    guard.time_budget = time_budget
+    guard.memory_budget = memory_budget
+    import registry
+    registry.load_plugins(read_json(os.path.join(queuedir, config_file)).get("plugins", []))
+    while True:
+        reclaim_expired(queuedir, lease_time)
+        lease = claim(queuedir)
+        if lease is not None:
+            process(queuedir, lease, lease_time)
+            continue
+        if not os.listdir(os.path.join(queuedir, leases_dir)):
+            break # nothing left to do
+        time.sleep(poll_interval) # wait for the other workers or their leases to expire
+
+
+def status(queuedir):
+    """
+    returns the number of units in todo, leases and done.
+    """
+    return [len([n for n in os.listdir(os.path.join(queuedir, d)) if ".json" in n and not n.endswith(".tmp")])
+            for d in (todo_dir, leases_dir, done_dir)]
+
+
+def merge(queuedir, resultsdir):
+    """
+    Combines the results of all done units into results/jf_<detector>.json.
+    """
+    config = read_json(os.path.join(queuedir, config_file))
+    units = [read_json(os.path.join(queuedir, done_dir, n))
+             for n in os.listdir(os.path.join(queuedir, done_dir)) if n.endswith(".json")]
+    units.sort(key=lambda u: (config["leads"].index(u["lead"]),
+                              config["experiments"].index(u["experiment"]),
+                              u["subject"]))
+    table = results.ResultTable(jf_analysis.JFResult)
+    for u in units:
+        if u["result"] is not None:
+            table.append(u["detector"], u["lead"], u["experiment"], u["subject"],
+                         jf_analysis.JFResult.from_json(u["result"]), u.get("error"))
+    todo, leased, done = status(queuedir)
+    if todo + leased > 0:
+        print("WARNING: {} units are not done yet, the results are partial.".format(todo + leased))
+    os.makedirs(resultsdir, exist_ok=True)
+    for detectorname in config["detectors"]:
+        results.write_json(os.path.join(resultsdir, "jf_"+detectorname+".json"),
+                           table.to_json(detectorname, config["leads"], config["experiments"]))
+    print("Merged {} units into {}".format(len(units), resultsdir))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed JF evaluation over a shared directory.")
+    parser.add_argument("command", choices=["init", "work", "status", "merge"])
+    parser.add_argument("queuedir", help="shared queue directory")
+    parser.add_argument("--detectors", nargs="+", help="registered detector names (default: all)")
+    parser.add_argument("--plugins", nargs="+", default=[], help="modules which register detectors")
+    parser.add_argument("--leads", nargs="+", help="recording leads (default: as the runner)")
+    parser.add_argument("--experiments", nargs="+", help="experiments (default: as the runner)")
+    parser.add_argument("--subjects", type=int, nargs="+", default=list(range(0, 25)))
+    parser.add_argument("--processes", type=int, default=1, help="worker processes on this machine")
+    parser.add_argument("--lease", type=float, default=lease_time, help="lease time in s")
+    parser.add_argument("--time-budget", type=float, default=guard.time_budget, help="time budget of a unit in s")
+    parser.add_argument("--memory-budget", type=float, default=guard.memory_budget, help="memory budget of a unit in MB, 0 for no limit")
+    parser.add_argument("--resultsdir", default="results")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        import jf_evaluate_all_detectors as runner
+        import registry
+        registry.load_plugins(args.plugins)
+        detectornames = args.detectors or registry.names()
+        init(args.queuedir, detectornames, args.leads or runner.all_recording_leads,
+             args.experiments or runner.all_experiments, args.subjects, args.plugins)
+    elif args.command == "work":
+        workers = [Process(target=work, args=(args.queuedir, args.lease, args.time_budget, args.memory_budget)) for i in range(args.processes)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    elif args.command == "status":
+        print("todo: {}, leased: {}, done: {}".format(*status(args.queuedir)))
+    elif args.command == "merge":
+        merge(args.queuedir, args.resultsdir)